@@ -1,42 +1,267 @@
-import io, os, uuid, datetime, pandas as pd
+import io, os, uuid, datetime, time, json
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+import pyarrow as pa, pyarrow.compute as pc, pyarrow.csv as pacsv, pyarrow.parquet as pq
 from sqlalchemy import text
 import boto3
-from .db import engine
+from botocore.exceptions import ClientError
+from .db import engine, copy_merge
+from . import catalog, watermark, instrument, id_ranges
+from .ingest import UNNEST_INSERT_SQL, log, _arrow_ids
+from .error_sink import ErrorSink
+from .rollup import with_rollup
+from .s3 import S3MultipartWriter, S3RangeFile
 
 BUCKET        = os.getenv("S3_BUCKET")
 REGION        = os.getenv("AWS_REGION", "us-east-1")
 BACKUP_PREFIX = os.getenv("BACKUP_PREFIX", "backup/")
+BACKUP_CHUNK_ROWS = int(os.getenv("BACKUP_CHUNK_ROWS", "100000"))   # filas por row group
+RESTORE_PREFETCH  = int(os.getenv("RESTORE_PREFETCH", "2"))         # row groups descargándose por delante
 s3 = boto3.client("s3", region_name=REGION)
 
-def backup_table_parquet(table: str) -> dict:
-    with engine.begin() as conn:
-        df = pd.read_sql(text(f"SELECT * FROM app.{table}"), conn)
+TABLE_COLS = {
+    "departments": ("id", "name"),
+    "jobs":        ("id", "name"),
+    "employees":   ("id", "name", "dt", "department_id", "job_id"),
+}
+TABLE_SCHEMAS = {
+    "departments": pa.schema([("id", pa.int64()), ("name", pa.string())]),
+    "jobs":        pa.schema([("id", pa.int64()), ("name", pa.string())]),
+    "employees":   pa.schema([("id", pa.int64()), ("name", pa.string()), ("dt", pa.timestamp("us")),
+                              ("department_id", pa.int64()), ("job_id", pa.int64())]),
+}
+
+def _write_parquet(conn, table: str, sql: str, params: dict, key: str, chunk: int) -> dict:
+    """Streams one query through a server-side cursor, one Parquet row group per chunk, into an
+    S3 multipart upload. Peak memory ~ one chunk + one upload part, whatever the table size."""
+    schema = TABLE_SCHEMAS[table]
+    rows = groups = 0
+    with S3MultipartWriter(BUCKET, key, client=s3) as out:
+        result = conn.execution_options(stream_results=True, yield_per=chunk).execute(text(sql), params)
+        with pq.ParquetWriter(out, schema) as writer:
+            for part in result.partitions(chunk):
+                columns = list(zip(*part))
+                writer.write_batch(pa.RecordBatch.from_arrays(
+                    [pa.array(c, type=f.type) for c, f in zip(columns, schema)], schema=schema),
+                    row_group_size=chunk)
+                rows += len(part); groups += 1
+    return {"rows": rows, "row_groups": groups, "bytes": out.bytes, "parts": out.parts}
+
+def _incremental_prefix(table: str) -> str:
+    return f"{BACKUP_PREFIX.rstrip('/')}/parquet/{table}/incremental"
+
+def _read_manifest(key: str) -> Optional[dict]:
+    try:
+        return json.loads(s3.get_object(Bucket=BUCKET, Key=key)["Body"].read())
+    except ClientError as e:
+        if e.response.get("Error", {}).get("Code") in ("NoSuchKey", "404"):
+            return None
+        raise
+
+def _backup_incremental(table: str, chunk: int) -> dict:
+    """Writes only the rows committed since the previous incremental run (employees: one file per
+    year under year=YYYY/), then appends the files and the new high-water mark to the manifest.
+
+    The high-water mark is the run's Postgres snapshot: every row carries the id of the transaction
+    that inserted it (ingest_xid), and the next run takes the rows whose transaction that snapshot
+    did not see. Ids come from the source files and writers commit out of order, so an id or
+    sequence cut-off would miss rows that commit late; a snapshot misses none and repeats none."""
+    cols  = ", ".join(TABLE_COLS[table])
+    base  = _incremental_prefix(table)
+    mkey  = f"{base}/_manifest.json"
+    run   = f"{datetime.datetime.utcnow().strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex}"
+    files = []
+    # REPEATABLE READ: snapshot, filas y archivos salen del mismo snapshot
+    with engine.connect().execution_options(isolation_level="REPEATABLE READ") as conn:
+        # dos backups incrementales de la misma tabla no se pisan el manifest
+        conn.execute(text("SELECT pg_advisory_xact_lock(hashtext(:k))"), {"k": f"backup:{table}"})
+        snapshot = conn.execute(text("SELECT CAST(pg_current_snapshot() AS text)")).scalar()
+        man = _read_manifest(mkey) or {"table": table, "partition_by": "year" if table == "employees" else None,
+                                       "high_water": {"snapshot": None}, "files": []}
+        # manifests previos al snapshot (high-water por id): la primera corrida vuelve a copiar todo
+        after = man["high_water"].get("snapshot")
+        where, params = ("TRUE", {}) if after is None else (
+            "ingest_xid >= pg_snapshot_xmin(CAST(:after AS pg_snapshot)) "
+            "AND NOT pg_visible_in_snapshot(ingest_xid, CAST(:after AS pg_snapshot))", {"after": after})
+        if table == "employees":
+            years = [r[0] for r in conn.execute(text(
+                f"SELECT DISTINCT EXTRACT(YEAR FROM dt)::int FROM app.employees WHERE {where} ORDER BY 1"), params)]
+            for y in years:
+                key = f"{base}/year={y}/{table}-{run}.parquet"
+                st  = _write_parquet(conn, table, f"""
+                    SELECT {cols} FROM app.employees
+                    WHERE {where} AND dt >= make_timestamp(:y, 1, 1, 0, 0, 0) AND dt < make_timestamp(:y + 1, 1, 1, 0, 0, 0)
+                """, {**params, "y": y}, key, chunk)
+                files.append({"key": key, "year": y, **st})
+        elif conn.execute(text(f"SELECT EXISTS (SELECT 1 FROM app.{table} WHERE {where})"), params).scalar():
+            key = f"{base}/{table}-{run}.parquet"
+            files.append({"key": key, "year": None,
+                          **_write_parquet(conn, table, f"SELECT {cols} FROM app.{table} WHERE {where}", params, key, chunk)})
+
+        if files:
+            man["high_water"] = {"snapshot": snapshot}
+            man["files"] += [{"key": f["key"], "year": f["year"], "rows": f["rows"], "after": after} for f in files]
+            man["updated_at"] = datetime.datetime.utcnow().isoformat()
+            s3.put_object(Bucket=BUCKET, Key=mkey, Body=json.dumps(man, indent=2).encode("utf-8"),
+                          ContentType="application/json")
+    return {"files": files, "high_water": man["high_water"], "after": after, "manifest": mkey}
+
+def backup_table_parquet(table: str, chunk_rows: int = None, incremental: bool = False) -> dict:
+    """Full backup: the whole table into one Parquet file. Incremental: only rows added since the
+    previous incremental run, tracked by a manifest under BACKUP_PREFIX (see _backup_incremental)."""
+    if table not in TABLE_COLS:
+        raise ValueError("table not allowed")
+    chunk = int(chunk_rows or BACKUP_CHUNK_ROWS)
+    t0 = time.time()
+    if incremental:
+        with instrument.QUERY_SECONDS.time(query="backup_incremental", table=table):
+            res = _backup_incremental(table, chunk)
+        return {"table": table, "incremental": True, "rows": sum(f["rows"] for f in res["files"]),
+                "chunk_rows": chunk, **res, "elapsed_sec": round(time.time() - t0, 2)}
+
     ts  = datetime.datetime.utcnow().strftime("%Y%m%dT%H%M%S")
     key = f"{BACKUP_PREFIX.rstrip('/')}/parquet/{table}/{table}-{ts}-{uuid.uuid4().hex}.parquet"
-    bio = io.BytesIO()
-    df.to_parquet(bio, index=False)
-    s3.put_object(Bucket=BUCKET, Key=key, Body=bio.getvalue())
-    return {"table": table, "rows": len(df), "s3_key": key}
-
-def restore_table_parquet(table: str, key: str, batch_size: int = 1000) -> dict:
-    obj = s3.get_object(Bucket=BUCKET, Key=key)
-    df  = pd.read_parquet(io.BytesIO(obj["Body"].read()))
-    rows = df.to_dict(orient="records")
-
-    if table == "departments":
-        sql = text("INSERT INTO app.departments(id,name) VALUES(:id,:name) ON CONFLICT(id) DO NOTHING")
-    elif table == "jobs":
-        sql = text("INSERT INTO app.jobs(id,name) VALUES(:id,:name) ON CONFLICT(id) DO NOTHING")
-    elif table == "employees":
-        sql = text("""INSERT INTO app.employees(id,name,dt,department_id,job_id)
-                      VALUES(:id,:name,:dt,:department_id,:job_id) ON CONFLICT(id) DO NOTHING""")
-    else:
+    with instrument.QUERY_SECONDS.time(query="backup", table=table), engine.connect() as conn:
+        st = _write_parquet(conn, table, f"SELECT {', '.join(TABLE_COLS[table])} FROM app.{table}", {}, key, chunk)
+    return {"table": table, **st, "chunk_rows": chunk, "s3_key": key,
+            "elapsed_sec": round(time.time() - t0, 2)}
+
+def _catalog_filter(batch: pa.RecordBatch, sink: ErrorSink) -> pa.RecordBatch:
+    """Drops employees whose department/job is not in the catalog (they would fail the FK and
+    abort the restore) into `sink`, with the same `_reason` the ingest uses."""
+    dep, job = batch.column("department_id"), batch.column("job_id")
+
+    def check(cat: catalog.CatalogSnapshot):
+        dept_arr, job_arr = _arrow_ids(cat)
+        dep_ok = pc.is_in(dep, value_set=dept_arr)
+        return dep_ok, pc.and_(dep_ok, pc.is_in(job, value_set=job_arr))
+
+    cat = catalog.get()
+    dep_ok, ok = check(cat)
+    if not pc.all(ok).as_py():
+        newer = catalog.refresh_on_miss(cat)
+        if newer.departments != cat.departments or newer.jobs != cat.jobs:
+            dep_ok, ok = check(newer)
+    if pc.all(ok).as_py():
+        return batch
+    reason = pc.if_else(dep_ok,
+                        pc.binary_join_element_wise("job_id ", pc.cast(job, pa.string()), " not in catalog", ""),
+                        pc.binary_join_element_wise("department ", pc.cast(dep, pa.string()), " not in catalog", ""))
+    sink.write(batch.append_column("_reason", reason).filter(pc.invert(ok)).to_pylist())
+    return batch.filter(ok)
+
+def _restore_chunk(conn, table: str, batch: pa.RecordBatch, mode: str) -> int:
+    """Writes one Arrow batch column-wise (unnest arrays or CSV COPY), never as per-row dicts."""
+    cols = TABLE_COLS[table]
+    if mode == "copy":
+        buf = io.BytesIO()
+        pacsv.write_csv(batch, buf, pacsv.WriteOptions(include_header=False))
+        return copy_merge(conn, table, cols, csv_data=buf.getvalue(),
+                          wrap=with_rollup if table == "employees" else None)
+    res = conn.execute(UNNEST_INSERT_SQL[table], {c: batch.column(i).to_pylist() for i, c in enumerate(cols)})
+    return res.rowcount or 0
+
+def _restore_file(table: str, key: str, batch_size: int, mode: str, prefetch: int, st: dict, t0: float,
+                  sink: ErrorSink, existing: Optional[id_ranges.IdRanges] = None) -> None:
+    """Restores one Parquet object row group by row group, adding its counters to `st`."""
+    cols   = list(TABLE_COLS[table])
+    schema = TABLE_SCHEMAS[table]
+    src  = S3RangeFile(BUCKET, key, client=s3)
+    meta = pq.ParquetFile(src).metadata
+    n_groups = meta.num_row_groups
+    st["bytes_fetched"] += src.bytes_read; st["range_requests"] += src.requests
+
+    def fetch(i: int):
+        # un archivo por row group: los hilos no comparten posición; el footer ya está leído
+        f = S3RangeFile(BUCKET, key, client=s3, size=src.size)
+        tbl = pq.ParquetFile(f, metadata=meta).read_row_group(i, columns=cols)
+        return tbl.select(cols).cast(schema), f.bytes_read, f.requests
+
+    with ThreadPoolExecutor(max_workers=prefetch) as pool:
+        pending = deque(pool.submit(fetch, i) for i in range(min(prefetch, n_groups)))
+        nxt, done = len(pending), 0
+        try:
+            while pending:
+                tbl, nbytes, nreq = pending.popleft().result()
+                if nxt < n_groups:
+                    pending.append(pool.submit(fetch, nxt)); nxt += 1
+                st["bytes_fetched"] += nbytes; st["range_requests"] += nreq
+                for batch in tbl.to_batches(max_chunksize=batch_size):
+                    st["rows"] += batch.num_rows
+                    if existing is not None:
+                        batch, n = existing.drop_batch(batch)
+                        st["skipped_existing"] += n
+                    if table == "employees":
+                        batch = _catalog_filter(batch, sink)
+                    if not batch.num_rows:
+                        continue
+                    with instrument.DB_BATCH_SECONDS.time(path="restore", mode=mode), engine.begin() as conn:
+                        st["restored"] += _restore_chunk(conn, table, batch, mode)
+                    instrument.DB_BATCH_ROWS.inc(batch.num_rows, path="restore", mode=mode)
+                st["row_groups"] += 1; done += 1
+                elapsed = time.time() - t0
+                log.info(f"[restore {table}] {key} row_group={done}/{n_groups} "
+                         f"rows={st['rows']} restored={st['restored']} "
+                         f"rows_per_sec={st['rows'] / elapsed if elapsed else 0:0.0f}")
+        finally:
+            for f in pending:
+                f.cancel()
+
+def _manifest_keys(table: str, manifest: str, year_from: Optional[int], year_to: Optional[int]) -> List[str]:
+    man = _read_manifest(manifest)
+    if man is None:
+        raise ValueError(f"manifest not found: {manifest}")
+    if man.get("table") != table:
+        raise ValueError(f"manifest is for table {man.get('table')}")
+    if (year_from is not None or year_to is not None) and man.get("partition_by") != "year":
+        raise ValueError("year range needs a year-partitioned manifest")
+    lo = year_from if year_from is not None else -10**9
+    hi = year_to if year_to is not None else 10**9
+    return [f["key"] for f in man["files"] if f["year"] is None or lo <= f["year"] <= hi]
+
+def restore_table_parquet(table: str, key: str = None, batch_size: int = 1000, mode: str = "insert",
+                          prefetch: int = None, manifest: str = None,
+                          year_from: int = None, year_to: int = None, prefilter: bool = False) -> dict:
+    """Restores one Parquet backup (`key`) or every file listed in an incremental `manifest`,
+    optionally only the year=YYYY partitions within [year_from, year_to]. Each file is read row
+    group by row group: footer and column chunks come from S3 range GETs, the next `prefetch` row
+    groups download while the current one is written, and every `batch_size` rows are committed
+    on their own. Rows already present are skipped; employees whose department/job is missing
+    go to the error sink instead of failing the restore. With `prefilter` (employees only) ids
+    already in the table are dropped before the write, counted in skipped_existing."""
+    if table not in TABLE_COLS:
         raise ValueError("table not allowed")
+    if mode not in ("insert", "copy"):
+        raise ValueError("mode must be insert|copy")
+    if (key is None) == (manifest is None):
+        raise ValueError("pass either key or manifest")
+    if manifest is None and (year_from is not None or year_to is not None):
+        raise ValueError("year range needs a manifest")
+    prefetch = max(1, int(prefetch or RESTORE_PREFETCH))
+    if prefilter and table != "employees":
+        raise ValueError("prefilter is only supported for employees")
+    keys = [key] if manifest is None else _manifest_keys(table, manifest, year_from, year_to)
+    existing = id_ranges.load() if prefilter else None
+
+    t0 = time.time()
+    st = {"rows": 0, "restored": 0, "skipped_existing": 0, "row_groups": 0, "bytes_fetched": 0, "range_requests": 0}
+    sink = ErrorSink(f"restore_{table}_errors")
+    try:
+        with sink:
+            for k in keys:
+                _restore_file(table, k, batch_size, mode, prefetch, st, t0, sink, existing)
+    finally:
+        # lo ya confirmado queda visible aunque falle un row group posterior
+        if st["rows"]:
+            if table != "employees":
+                catalog.invalidate()
+            watermark.bump()
 
-    inserted = 0
-    with engine.begin() as conn:
-        for i in range(0, len(rows), batch_size):
-            batch = rows[i:i+batch_size]
-            res = conn.execute(sql, batch)
-            inserted += res.rowcount or 0
-    return {"table": table, "restored": inserted, "from_s3": key}
+    elapsed = time.time() - t0
+    return {"table": table, "restored": st.pop("restored"), **st, "invalid": sink.rows,
+            "errors_s3": sink.close() or None, "files": len(keys),
+            "mode": mode, "batch_size": batch_size, "prefetch": prefetch,
+            "elapsed_sec": round(elapsed, 2), "rows_per_sec": round(st["rows"] / elapsed, 1) if elapsed else None,
+            "from_s3": manifest or key, "year_from": year_from, "year_to": year_to,
+            **({"prefilter": id_ranges.report(existing)} if prefilter else {})}
@@ -0,0 +1,52 @@
+# app/catalog.py
+"""In-process cache of department/job ids used by the employee membership checks."""
+import os, threading, time
+from typing import FrozenSet, NamedTuple
+from sqlalchemy import text
+from .db import engine
+
+CATALOG_TTL_SEC = float(os.getenv("CATALOG_TTL_SEC", "300"))
+
+class CatalogSnapshot(NamedTuple):
+    version: int
+    departments: FrozenSet[int]
+    jobs: FrozenSet[int]
+    loaded_at: float
+
+_lock    = threading.Lock()
+_current = CatalogSnapshot(0, frozenset(), frozenset(), 0.0)
+_stale   = True
+_invalidations = 0   # una invalidación durante un _load deja el cache stale
+
+def _load() -> CatalogSnapshot:
+    global _current, _stale
+    gen = _invalidations
+    with engine.begin() as conn:
+        deps = frozenset(row[0] for row in conn.execute(text("SELECT id FROM app.departments")))
+        jobs = frozenset(row[0] for row in conn.execute(text("SELECT id FROM app.jobs")))
+    _current = CatalogSnapshot(_current.version + 1, deps, jobs, time.monotonic())
+    _stale = _invalidations != gen
+    return _current
+
+def get() -> CatalogSnapshot:
+    """Current snapshot; reloads when invalidated or older than CATALOG_TTL_SEC."""
+    snap = _current
+    if not _stale and time.monotonic() - snap.loaded_at < CATALOG_TTL_SEC:
+        return snap
+    with _lock:
+        if _stale or time.monotonic() - _current.loaded_at >= CATALOG_TTL_SEC:
+            return _load()
+        return _current
+
+def refresh_on_miss(seen: CatalogSnapshot) -> CatalogSnapshot:
+    """Called after an id was not found in `seen`: reloads once unless a newer snapshot exists."""
+    with _lock:
+        if _current.version != seen.version and not _stale:
+            return _current
+        return _load()
+
+def invalidate() -> None:
+    """Marks the cache stale; call after writing app.departments or app.jobs."""
+    global _stale, _invalidations
+    _invalidations += 1
+    _stale = True
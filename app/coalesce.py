@@ -0,0 +1,89 @@
+# app/coalesce.py
+"""Micro-batching of concurrent online writes: rows from many requests, one INSERT per flush."""
+import asyncio, os, threading
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+ONLINE_FLUSH_MS       = float(os.getenv("ONLINE_FLUSH_MS", "5"))
+ONLINE_FLUSH_ROWS     = int(os.getenv("ONLINE_FLUSH_ROWS", "5000"))
+ONLINE_FLUSH_INFLIGHT = int(os.getenv("ONLINE_FLUSH_INFLIGHT", "4"))
+
+# flush_fn(table, groups) -> inserted count per group; a coroutine, awaited on the event loop
+FlushFn = Callable[[str, List[List[Dict[str, Any]]]], Awaitable[List[int]]]
+
+class Coalescer:
+    """Buffers rows per table for up to `flush_ms` or `max_rows`, then writes them with one
+    flush_fn call. Each submit() gets back the inserted count of its own rows; if the combined
+    flush fails, every group is retried alone so one caller's error doesn't fail the others."""
+
+    def __init__(self, flush_fn: FlushFn, flush_ms: float = ONLINE_FLUSH_MS,
+                 max_rows: int = ONLINE_FLUSH_ROWS, max_inflight: int = ONLINE_FLUSH_INFLIGHT):
+        self.flush_fn = flush_fn
+        self.flush_ms = flush_ms
+        self.max_rows = max_rows
+        self.max_inflight = max_inflight
+        self._buf: Dict[str, List[Tuple[List[Dict[str, Any]], asyncio.Future]]] = {}
+        self._rows: Dict[str, int] = {}
+        self._timers: Dict[str, asyncio.TimerHandle] = {}
+        self._tasks: set = set()
+        self._sem: Optional[asyncio.Semaphore] = None
+        self._lock = threading.Lock()
+        self._stats = {"requests": 0, "flushes": 0, "rows": 0, "fill_ratio_sum": 0.0,
+                       "flush_by_size": 0, "flush_by_timer": 0, "fallback_flushes": 0}
+
+    async def submit(self, table: str, rows: List[Dict[str, Any]]) -> int:
+        loop = asyncio.get_running_loop()
+        fut  = loop.create_future()
+        self._buf.setdefault(table, []).append((rows, fut))
+        self._rows[table] = self._rows.get(table, 0) + len(rows)
+        if self._rows[table] >= self.max_rows:
+            self._flush(table, "size")
+        elif table not in self._timers:
+            self._timers[table] = loop.call_later(self.flush_ms / 1000.0, self._flush, table, "timer")
+        return await fut
+
+    def _flush(self, table: str, reason: str):
+        timer = self._timers.pop(table, None)
+        if timer is not None:
+            timer.cancel()
+        pending, nrows = self._buf.pop(table, []), self._rows.pop(table, 0)
+        if not pending:
+            return
+        with self._lock:
+            st = self._stats
+            st["requests"] += len(pending); st["flushes"] += 1; st["rows"] += nrows
+            st["fill_ratio_sum"] += min(1.0, nrows / self.max_rows)
+            st[f"flush_by_{reason}"] += 1
+        task = asyncio.get_running_loop().create_task(self._write(table, pending))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _write(self, table: str, pending: List[Tuple[List[Dict[str, Any]], asyncio.Future]]):
+        if self._sem is None:
+            self._sem = asyncio.Semaphore(self.max_inflight)
+        async with self._sem:
+            try:
+                counts = await self.flush_fn(table, [rows for rows, _ in pending])
+            except Exception:
+                with self._lock:
+                    self._stats["fallback_flushes"] += 1
+                for rows, fut in pending:
+                    try:
+                        n = (await self.flush_fn(table, [rows]))[0]
+                    except Exception as e:
+                        if not fut.done(): fut.set_exception(e)
+                    else:
+                        if not fut.done(): fut.set_result(n)
+                return
+        for (_, fut), n in zip(pending, counts):
+            if not fut.done():
+                fut.set_result(n)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            st = dict(self._stats)
+        fill, n = st.pop("fill_ratio_sum"), st["flushes"]
+        st["avg_fill_ratio"]         = round(fill / n, 4) if n else None
+        st["avg_rows_per_flush"]     = round(st["rows"] / n, 1) if n else None
+        st["avg_requests_per_flush"] = round(st["requests"] / n, 2) if n else None
+        st.update(flush_ms=self.flush_ms, max_rows=self.max_rows, max_inflight=self.max_inflight)
+        return st
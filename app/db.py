@@ -1,6 +1,10 @@
-import os
+import os, time
+from typing import Any, Callable, Iterable, Optional, Sequence
 from sqlalchemy import text, create_engine
 from sqlalchemy.engine import URL
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+from . import instrument
 
 DB_HOST = os.getenv("DB_HOST")
 DB_PORT = int(os.getenv("DB_PORT", "5432"))
@@ -17,10 +21,68 @@ database_url = URL.create(
     database=DB_NAME,
 )
 
-engine = create_engine(database_url, pool_pre_ping=True, pool_size=5, max_overflow=5)
+# engine sync: ingestas batch, jobs, backup/restore. engine async: endpoints que atienden requests.
+POOL_SIZE          = int(os.getenv("DB_POOL_SIZE", "5"))
+MAX_OVERFLOW       = int(os.getenv("DB_MAX_OVERFLOW", "5"))
+ASYNC_POOL_SIZE    = int(os.getenv("DB_ASYNC_POOL_SIZE", "10"))
+ASYNC_MAX_OVERFLOW = int(os.getenv("DB_ASYNC_MAX_OVERFLOW", "10"))
 
-def ping_db():
-    with engine.connect() as conn:
-        return conn.execute(text("SELECT 1")).scalar()
+class _TimedCheckout:
+    """Pool mixin: records how long each checkout waited (apidata_db_pool_checkout_seconds)."""
+    label = ""
+    def _do_get(self):
+        t = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            instrument.POOL_WAIT_SECONDS.observe(time.perf_counter() - t, engine=self.label)
+
+class _TimedQueuePool(_TimedCheckout, QueuePool):
+    label = "sync"
+
+class _TimedAsyncPool(_TimedCheckout, AsyncAdaptedQueuePool):
+    label = "async"
+
+engine = create_engine(database_url, pool_pre_ping=True, pool_size=POOL_SIZE, max_overflow=MAX_OVERFLOW,
+                       poolclass=_TimedQueuePool)
+# mismo dialecto psycopg 3, en su modo asyncio
+async_engine = create_async_engine(database_url, pool_pre_ping=True, pool_size=ASYNC_POOL_SIZE,
+                                   max_overflow=ASYNC_MAX_OVERFLOW, poolclass=_TimedAsyncPool)
+instrument.gauge("apidata_db_pool_checked_out", "Pooled connections currently in use (sync engine)",
+                 lambda: engine.pool.checkedout())
+instrument.gauge("apidata_db_async_pool_checked_out", "Pooled connections currently in use (async engine)",
+                 lambda: async_engine.pool.checkedout())
+
+async def ping_db_async():
+    async with async_engine.connect() as conn:
+        return (await conn.execute(text("SELECT 1"))).scalar()
+
+def copy_merge(conn, table: str, columns: Sequence[str], rows: Iterable[Sequence[Any]] = (),
+               wrap: Optional[Callable[[str], str]] = None, csv_data: Optional[bytes] = None) -> int:
+    """COPY rows into a temp staging table and merge them into app.<table> in one statement.
+
+    The staging table is a session TEMP table (never WAL-logged) dropped at commit, so
+    several calls inside the same transaction reuse it. `csv_data` (header-less CSV, e.g.
+    from pyarrow.csv.write_csv) is sent as is instead of `rows`. `wrap` may turn the merge
+    into a statement returning one row per inserted row (e.g. rollup.with_rollup). Returns
+    the rows actually inserted.
+    """
+    cols  = ", ".join(columns)
+    stage = f"stage_{table}"
+    conn.execute(text(f"CREATE TEMP TABLE IF NOT EXISTS {stage} (LIKE app.{table} INCLUDING DEFAULTS) ON COMMIT DROP"))
+    conn.execute(text(f"TRUNCATE {stage}"))
+    with conn.connection.driver_connection.cursor() as cur:
+        if csv_data is not None:
+            with cur.copy(f"COPY {stage} ({cols}) FROM STDIN WITH (FORMAT csv)") as cp:
+                cp.write(csv_data)
+        else:
+            with cur.copy(f"COPY {stage} ({cols}) FROM STDIN") as cp:
+                for r in rows:
+                    cp.write_row(r)
+    merge = f"""INSERT INTO app.{table} ({cols})
+                SELECT {cols} FROM {stage}
+                ON CONFLICT (id) DO NOTHING"""
+    res = conn.execute(text(wrap(merge) if wrap else merge))
+    return res.rowcount or 0
 
 
@@ -0,0 +1,61 @@
+# app/error_sink.py
+"""Rejected rows streamed to S3 as JSONL while a load runs, instead of being kept in memory."""
+import datetime, gzip, json, os, threading, uuid
+from typing import Any, Dict, Iterable
+from .s3 import S3MultipartWriter
+
+BUCKET        = os.getenv("S3_BUCKET")
+BACKUP_PREFIX = os.getenv("BACKUP_PREFIX", "backup/")
+ERRORS_PART_BYTES = max(int(os.getenv("ERRORS_PART_BYTES", str(5 * 1024 * 1024))), 5 * 1024 * 1024)
+ERRORS_GZIP       = os.getenv("ERRORS_GZIP", "0").lower() in ("1", "true", "yes")
+
+class ErrorSink:
+    """One JSONL object (`.jsonl` or `.jsonl.gz`) per run under BACKUP_PREFIX/errors/. Nothing is
+    uploaded until the first row; each ERRORS_PART_BYTES filled goes up as one multipart part, so
+    memory stays at about one part however many rows are rejected. close() returns the key
+    ("" if no row was written)."""
+
+    def __init__(self, file_tag: str, compress: bool = None, part_size: int = ERRORS_PART_BYTES, client=None):
+        self.compress = ERRORS_GZIP if compress is None else compress
+        ts = datetime.datetime.utcnow().strftime("%Y%m%dT%H%M%S")
+        self.key = f"{BACKUP_PREFIX.rstrip('/')}/errors/{file_tag}-{ts}-{uuid.uuid4().hex}.jsonl" \
+                   + (".gz" if self.compress else "")
+        self.part_size, self.client = part_size, client
+        self.rows = 0
+        self._out = self._gz = None
+        self._lock = threading.Lock()
+
+    def write(self, rows: Iterable[Dict[str, Any]]):
+        data = "".join(json.dumps(r, ensure_ascii=False, default=str) + "\n" for r in rows).encode("utf-8")
+        if not data:
+            return
+        with self._lock:
+            if self._out is None:
+                self._out = S3MultipartWriter(BUCKET, self.key, self.part_size, client=self.client,
+                                              ContentType="application/gzip" if self.compress else "application/x-ndjson")
+                self._gz = gzip.GzipFile(fileobj=self._out, mode="wb") if self.compress else None
+            (self._gz or self._out).write(data)
+            self.rows += data.count(b"\n")
+
+    def close(self) -> str:
+        with self._lock:
+            if self._out is None:
+                return ""
+            if self._gz is not None:
+                self._gz.close()
+            self._out.close()
+            return self.key
+
+    def abort(self):
+        with self._lock:
+            if self._out is not None:
+                self._out.abort()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
@@ -0,0 +1,100 @@
+# app/export.py
+"""Streaming extracts of app.employees for downstream consumers: filters on dt / department / job,
+keyset pagination on (dt, id) (index employees_dt_id_idx, no OFFSET) and a server-side cursor, so
+memory stays at one EXPORT_BATCH_ROWS batch whatever the size of the extract."""
+import datetime, io, json, os
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+import pyarrow as pa
+from sqlalchemy import text
+from .db import async_engine
+from .metrics import name_joins
+from . import instrument
+
+EXPORT_BATCH_ROWS = int(os.getenv("EXPORT_BATCH_ROWS", "5000"))
+EXPORT_FORMATS = {"ndjson": "application/x-ndjson", "arrow": "application/vnd.apache.arrow.stream"}
+
+_SCHEMA = pa.schema([("id", pa.int32()), ("name", pa.string()), ("dt", pa.timestamp("us")),
+                     ("department_id", pa.int32()), ("job_id", pa.int32())])
+_NAMES_SCHEMA = _SCHEMA.append(pa.field("department", pa.string())).append(pa.field("job", pa.string()))
+
+def _query(dt_from: Optional[datetime.datetime], dt_to: Optional[datetime.datetime],
+           department_id: Optional[int], job_id: Optional[int],
+           after_dt: Optional[datetime.datetime], after_id: Optional[int],
+           limit: Optional[int], names: bool) -> Tuple[str, Dict[str, Any]]:
+    if (after_dt is None) != (after_id is None):
+        raise ValueError("after_dt and after_id go together (last row of the previous page)")
+    if dt_from is not None and dt_to is not None and dt_from >= dt_to:
+        raise ValueError("dt_from must be before dt_to")
+    where, params = [], {}
+    for cond, key, val in (("e.dt >= :dt_from", "dt_from", dt_from), ("e.dt < :dt_to", "dt_to", dt_to),
+                           ("e.department_id = :dep", "dep", department_id), ("e.job_id = :job", "job", job_id)):
+        if val is not None:
+            where.append(cond); params[key] = val
+    if after_dt is not None:
+        # comparación de filas: Postgres la resuelve como un rango sobre el índice (dt, id)
+        where.append("(e.dt, e.id) > (:after_dt, :after_id)")
+        params.update(after_dt=after_dt, after_id=after_id)
+    cols = "e.id, e.name, e.dt, e.department_id, e.job_id" + (", d.name AS department, j.name AS job" if names else "")
+    sql = f"""
+        SELECT {cols}
+        FROM app.employees e
+        {name_joins("e") if names else ""}
+        {"WHERE " + " AND ".join(where) if where else ""}
+        ORDER BY e.dt, e.id"""
+    if limit is not None:
+        sql += "\n        LIMIT :limit"
+        params["limit"] = limit
+    return sql, params
+
+def _ndjson(rows: List[Any], fields: List[str]) -> bytes:
+    out = []
+    for r in rows:
+        d = dict(zip(fields, r))
+        d["dt"] = d["dt"].isoformat()
+        out.append(json.dumps(d, ensure_ascii=False))
+    return ("\n".join(out) + "\n").encode("utf-8")
+
+def stream_employees(fmt: str = "ndjson",
+                     dt_from: Optional[datetime.datetime] = None,
+                     dt_to: Optional[datetime.datetime] = None,
+                     department_id: Optional[int] = None,
+                     job_id: Optional[int] = None,
+                     after_dt: Optional[datetime.datetime] = None,
+                     after_id: Optional[int] = None,
+                     limit: Optional[int] = None,
+                     names: bool = False) -> AsyncIterator[bytes]:
+    """Employees with dt in [dt_from, dt_to), ordered by (dt, id), as NDJSON lines or an Arrow IPC
+    stream. The next page starts after the last row received: after_dt/after_id = its dt/id.
+    Arguments are checked here (ValueError) so the caller can answer 400 before streaming."""
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"format must be one of {tuple(EXPORT_FORMATS)}")
+    sql, params = _query(dt_from, dt_to, department_id, job_id, after_dt, after_id, limit, names)
+    schema = _NAMES_SCHEMA if names else _SCHEMA
+
+    async def body() -> AsyncIterator[bytes]:
+        sink = io.BytesIO()
+        writer = pa.ipc.new_stream(sink, schema) if fmt == "arrow" else None
+
+        def drain() -> bytes:
+            data = sink.getvalue()
+            sink.seek(0); sink.truncate()
+            return data
+
+        with instrument.QUERY_SECONDS.time(query="export", format=fmt):
+            if writer:
+                yield drain()   # el schema sale antes de la primera fila
+            async with async_engine.connect() as conn:
+                result = await conn.stream(text(sql), params)   # cursor del lado del servidor
+                async for rows in result.partitions(EXPORT_BATCH_ROWS):
+                    if writer:
+                        cols = list(zip(*rows))
+                        writer.write_batch(pa.RecordBatch.from_arrays(
+                            [pa.array(c, type=f.type) for c, f in zip(cols, schema)], schema=schema))
+                        yield drain()
+                    else:
+                        yield _ndjson(rows, schema.names)
+            if writer:
+                writer.close()
+                yield drain()
+
+    return body()
@@ -0,0 +1,75 @@
+# app/id_ranges.py
+"""Ids already in app.employees as sorted [lo, hi] ranges (gaps and islands), loaded once when a
+re-ingest or restore starts so rows that ON CONFLICT would discard never leave the process.
+Mostly-contiguous ids collapse into a handful of ranges: memory depends on the number of gaps,
+not of rows (16 bytes per range)."""
+import os, time
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+import pyarrow as pa
+from sqlalchemy import text
+from .db import engine
+
+PREFILTER_MAX_RANGES = int(os.getenv("PREFILTER_MAX_RANGES", "4000000"))   # ~64 MB
+
+_RANGES_SQL = text("""
+    SELECT min(id) AS lo, max(id) AS hi
+    FROM (SELECT id, id - row_number() OVER (ORDER BY id) AS grp FROM app.employees) s
+    GROUP BY grp
+    ORDER BY lo
+""")
+
+class IdRanges:
+    """Read-only id set; safe to share between threads."""
+    def __init__(self, lo: np.ndarray, hi: np.ndarray, elapsed: float = 0.0):
+        self.lo, self.hi = lo, hi
+        self.elapsed = elapsed
+
+    def mask(self, ids) -> np.ndarray:
+        """Boolean array: True where the id is already in the table."""
+        ids = np.asarray(ids, dtype=np.int64)
+        if not len(self.lo):
+            return np.zeros(len(ids), dtype=bool)
+        i = np.searchsorted(self.lo, ids, side="right") - 1
+        return (i >= 0) & (ids <= self.hi[np.maximum(i, 0)])
+
+    def drop_rows(self, rows: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], int]:
+        """Rows whose id is not in the set, and how many were dropped."""
+        if not rows or not len(self.lo):
+            return rows, 0
+        seen = self.mask([r["id"] for r in rows])
+        kept = [r for r, s in zip(rows, seen) if not s]
+        return kept, len(rows) - len(kept)
+
+    def drop_batch(self, batch: pa.RecordBatch) -> Tuple[pa.RecordBatch, int]:
+        if not batch.num_rows or not len(self.lo):
+            return batch, 0
+        seen = self.mask(batch.column("id").to_numpy(zero_copy_only=False))
+        return batch.filter(pa.array(~seen)), int(seen.sum())
+
+    def stats(self) -> Dict[str, Any]:
+        return {"ranges": len(self.lo), "ids": int((self.hi - self.lo + 1).sum()),
+                "bytes": self.lo.nbytes + self.hi.nbytes, "load_sec": round(self.elapsed, 2)}
+
+def load() -> Optional[IdRanges]:
+    """Streams the ranges from Postgres. None if the ids are so scattered that the ranges would
+    pass PREFILTER_MAX_RANGES; the caller then writes every row as without a prefilter."""
+    t0 = time.time()
+    los, his, n = [], [], 0
+    with engine.connect() as conn:
+        res = conn.execution_options(stream_results=True, yield_per=100_000).execute(_RANGES_SQL)
+        for part in res.partitions():
+            n += len(part)
+            if n > PREFILTER_MAX_RANGES:
+                return None
+            arr = np.array(part, dtype=np.int64).reshape(-1, 2)
+            los.append(arr[:, 0]); his.append(arr[:, 1])
+    lo = np.concatenate(los) if los else np.empty(0, np.int64)
+    hi = np.concatenate(his) if his else np.empty(0, np.int64)
+    return IdRanges(lo, hi, time.time() - t0)
+
+def report(ranges: Optional[IdRanges]) -> Dict[str, Any]:
+    """`prefilter` entry of a load response."""
+    if ranges is None:
+        return {"disabled": f"more than PREFILTER_MAX_RANGES={PREFILTER_MAX_RANGES} id ranges"}
+    return ranges.stats()
@@ -1,8 +1,15 @@
 # -*- coding: utf-8 -*-
-import os, csv, io, boto3, datetime, uuid, time, json, logging
-from typing import Dict, Any, List, Iterable, Optional
+import os, csv, io, boto3, datetime, uuid, time, json, logging, queue, threading, itertools, fnmatch
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Iterable, Iterator, Optional, Tuple
+import pyarrow as pa, pyarrow.compute as pc, pyarrow.csv as pacsv, pyarrow.parquet as pq
 from sqlalchemy import text
-from .db import engine
+from .db import engine, copy_merge, POOL_SIZE, MAX_OVERFLOW
+from . import catalog, watermark, instrument, id_ranges
+from .error_sink import ErrorSink
+from .rollup import with_rollup
+from .s3 import S3RangeFile
 
 # --- env ---
 BUCKET        = os.getenv("S3_BUCKET")
@@ -10,10 +17,27 @@ RAW_PREFIX    = os.getenv("S3_PREFIX", "raw/")
 BACKUP_PREFIX = os.getenv("BACKUP_PREFIX", "backup/")
 REGION        = os.getenv("AWS_REGION", "us-east-1")
 BATCH_SIZE    = int(os.getenv("BATCH_SIZE", "1000"))
+INGEST_WRITERS = int(os.getenv("INGEST_WRITERS", "1"))
+QUEUE_DEPTH    = int(os.getenv("INGEST_QUEUE_DEPTH", "4"))
+RANGE_BYTES    = int(os.getenv("S3_RANGE_BYTES", str(8 * 1024 * 1024)))
+MAX_RECORD_BYTES = int(os.getenv("MAX_RECORD_BYTES", str(1024 * 1024)))   # tope de un registro CSV (comillas sin cerrar)
+# conexiones escribiendo a la vez entre todas las ingestas del proceso (jobs concurrentes, archivos de un
+# prefijo): cada lote toma un cupo mientras escribe. El resto del pool queda para checkpoints, heartbeats,
+# catálogo y auditoría (una por job corriendo, JOB_WORKERS de app/jobs.py) y dos para los endpoints sync
+WRITE_SLOTS    = max(1, POOL_SIZE + MAX_OVERFLOW - int(os.getenv("JOB_WORKERS", "2")) - 2)
+MAX_WRITERS    = WRITE_SLOTS   # más hilos por ingesta sólo esperarían cupo
 
 DEPARTMENTS_FILE = os.getenv("DEPARTMENTS_FILE", "departments.csv")
 JOBS_FILE        = os.getenv("JOBS_FILE", "jobs.csv")
 EMPLOYEES_FILE   = os.getenv("EMPLOYEES_FILE", "hired_employees.csv")
+EMPLOYEES_PATTERN = os.getenv("EMPLOYEES_PATTERN", "hired_employees*")   # shards para la ingesta por prefijo
+INGEST_FILES_CONCURRENCY = int(os.getenv("INGEST_FILES_CONCURRENCY", "4"))
+RAW_SUFFIXES = (".csv", ".csv.gz", ".csv.zst", ".csv.zstd", ".parquet")
+
+EMPLOYEE_COLS = ("id", "name", "dt", "department_id", "job_id")
+INGEST_MODES  = ("insert", "copy")   # insert: INSERT unnest(arrays) ON CONFLICT; copy: COPY -> staging -> merge
+VALIDATORS    = ("python", "arrow")  # validación fila a fila | vectorizada por record batch
+ARROW_BLOCK_BYTES = int(os.getenv("ARROW_BLOCK_BYTES", str(4 * 1024 * 1024)))
 
 s3  = boto3.client("s3", region_name=REGION)
 log = logging.getLogger("uvicorn")
@@ -22,31 +46,284 @@ log = logging.getLogger("uvicorn")
 def _normalize(name: str) -> str:
     return name.replace("\ufeff","").strip().lower().replace(" ", "_")
 
-def _read_csv_from_s3(key: str, expected_headers: Optional[List[str]] = None) -> List[Dict[str, Any]]:
-    obj = s3.get_object(Bucket=BUCKET, Key=key)
-    raw = obj["Body"].read().decode("utf-8-sig", errors="replace")
-    reader = csv.reader(io.StringIO(raw), delimiter=",")
-    rows = list(reader)
-    if not rows:
-        return []
-    headers = [_normalize(h) for h in rows[0]]
+# --- formatos de entrada: por extensión de la key ---
+def _raw_format(key: str) -> str:
+    """csv | gzip | zstd | parquet. Compressed files are CSV (`.csv.gz`, `.csv.zst`)."""
+    k = key.lower()
+    if k.endswith(".parquet"):
+        return "parquet"
+    if k.endswith(".gz"):
+        return "gzip"
+    if k.endswith((".zst", ".zstd")):
+        return "zstd"
+    return "csv"
+
+def _open_raw(key: str):
+    """Buffered binary stream (peek() works) with the CSV bytes: the S3 body, decompressed on the fly
+    if needed (pyarrow codecs, nothing is buffered beyond the read block)."""
+    with instrument.S3_SECONDS.time(op="get_object"):
+        body = s3.get_object(Bucket=BUCKET, Key=key)["Body"]
+    fmt = _raw_format(key)
+    raw = pa.CompressedInputStream(body, fmt) if fmt in ("gzip", "zstd") else pa.PythonFile(body, mode="r")
+    return io.BufferedReader(raw)
+
+def _iter_parquet_batches(key: str, start: int = 0, batch_rows: int = 64 * 1024,
+                          limit: Optional[int] = None, etag: Optional[str] = None) -> Iterator[Tuple[pa.RecordBatch, int]]:
+    """Record batches with normalized column names from row `start` on, each paired with the
+    number of file rows consumed after it. Only the footer and the needed row groups are fetched
+    (S3 range reads, conditional on `etag` if given); row groups wholly before `start` are skipped;
+    stops after `limit` rows."""
+    pf = pq.ParquetFile(S3RangeFile(BUCKET, key, client=s3, etag=etag))
+    md = pf.metadata
+    first, skip = 0, start
+    while first < md.num_row_groups and skip >= md.row_group(first).num_rows:
+        skip -= md.row_group(first).num_rows; first += 1
+    pos, n = start - skip, 0
+    if first >= md.num_row_groups:
+        return
+    for batch in pf.iter_batches(batch_size=batch_rows, row_groups=range(first, md.num_row_groups)):
+        if skip:
+            cut = min(skip, batch.num_rows)
+            batch, skip, pos = batch.slice(cut), skip - cut, pos + cut
+        if limit is not None and n + batch.num_rows > limit:
+            batch = batch.slice(0, limit - n)
+        if not batch.num_rows:
+            continue
+        n += batch.num_rows; pos += batch.num_rows
+        yield batch.rename_columns([_normalize(c) for c in batch.schema.names]), pos
+        if limit is not None and n >= limit:
+            return
+
+def _iter_parquet_rows(key: str) -> Iterator[Dict[str, Any]]:
+    """Rows as dicts of strings ("" for null), like the CSV readers yield them."""
+    for batch, _ in _iter_parquet_batches(key):
+        for r in batch.to_pylist():
+            yield {k: ("" if v is None else str(v)) for k, v in r.items()}
+
+def _iter_csv_from_s3(key: str, expected_headers: Optional[List[str]] = None) -> Iterator[Dict[str, Any]]:
+    """Streams rows as dicts. If the first line lacks `id` or any expected header, the file is
+    treated as header-less: `expected_headers` are used and the first line is data."""
+    tw  = io.TextIOWrapper(_open_raw(key), encoding="utf-8-sig", errors="replace", newline="")
+    reader = csv.reader(tw, delimiter=",")
+    first  = next(reader, None)
+    if first is None:
+        return
+    headers = [_normalize(h) for h in first]
+    data_rows: Iterable[List[str]] = reader
     if expected_headers and (("id" not in headers) or any(h not in headers for h in expected_headers if h)):
         headers = expected_headers[:]
-        data_rows = rows
-    else:
-        data_rows = rows[1:]
-    out: List[Dict[str, Any]] = []
+        data_rows = itertools.chain([first], reader)
     for r in data_rows:
-        out.append({headers[i]: (r[i] if i < len(headers) and i < len(r) else "") for i in range(len(headers))})
-    return out
+        yield {headers[i]: (r[i] if i < len(headers) and i < len(r) else "") for i in range(len(headers))}
 
 def _iter_employees_from_s3(key: str):
-    obj = s3.get_object(Bucket=BUCKET, Key=key)
-    tw = io.TextIOWrapper(obj["Body"], encoding="utf-8-sig", newline="")
+    tw = io.TextIOWrapper(_open_raw(key), encoding="utf-8-sig", newline="")
     reader = csv.DictReader(tw)
     for row in reader:
         yield { _normalize(k): (v or "").strip() for k, v in row.items() }
 
+# --- lectura paralela por rangos de bytes (asume una fila por línea, sin saltos dentro de comillas) ---
+def _get_range(key: str, start: int, end: int, etag: Optional[str] = None) -> bytes:
+    """Bytes [start, end] (inclusive) of the object; with `etag`, of that version only (IfMatch)."""
+    with instrument.S3_SECONDS.time(op="range_get"):
+        data = s3.get_object(Bucket=BUCKET, Key=key, Range=f"bytes={start}-{end}",
+                             **({"IfMatch": f'"{etag}"'} if etag else {}))["Body"].read()
+    instrument.S3_BYTES.inc(len(data), op="range_get")
+    return data
+
+def _next_line_start(key: str, pos: int, size: int, probe: int = 64 * 1024, etag: Optional[str] = None) -> int:
+    """Offset right after the first newline at or after pos (size if there is none)."""
+    while pos < size:
+        buf = _get_range(key, pos, min(pos + probe, size) - 1, etag)
+        i = buf.find(b"\n")
+        if i >= 0:
+            return pos + i + 1
+        pos += len(buf)
+    return size
+
+def _parse_range(raw: bytes, headers: List[str]) -> Iterator[Dict[str, Any]]:
+    for vals in csv.reader(io.StringIO(raw.decode("utf-8", errors="replace"), newline="")):
+        if vals:
+            yield {h: (vals[i].strip() if i < len(vals) else "") for i, h in enumerate(headers)}
+
+def _read_header(key: str, etag: Optional[str] = None) -> Tuple[List[str], int, int]:
+    """Normalized header names, offset of the first data byte and object size."""
+    size = s3.head_object(Bucket=BUCKET, Key=key, **({"IfMatch": f'"{etag}"'} if etag else {}))["ContentLength"]
+    if not size:
+        return [], 0, 0
+    data_start = _next_line_start(key, 0, size, etag=etag)
+    header = _get_range(key, 0, data_start - 1, etag).decode("utf-8-sig", errors="replace")
+    return [_normalize(h) for h in next(csv.reader([header.rstrip("\r\n")]), [])], data_start, size
+
+def _iter_employees_ranged(key: str, workers: int, ranges: Optional[List[Dict[str, int]]] = None):
+    """Same rows as _iter_employees_from_s3, fetched as concurrent byte ranges.
+
+    Range cuts are moved to the next line start, so every line belongs to exactly one range;
+    at most `workers` ranges are in flight, as raw bytes (threads don't speed up parsing), and
+    each is parsed here as it is consumed, in file order. If `ranges` is given, one
+    {"start", "end", "rows"} entry is appended per range, counting rows yielded.
+    """
+    headers, data_start, size = _read_header(key)
+    if not size:
+        return
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="s3-range") as pool:
+        cuts   = range(data_start + RANGE_BYTES, size, RANGE_BYTES)
+        bounds = [data_start, *pool.map(lambda p: _next_line_start(key, p, size), cuts), size]
+        spans  = iter([(a, b) for a, b in zip(bounds, bounds[1:]) if b > a])
+        pending: deque = deque()
+        for a, b in spans:
+            pending.append((a, b, pool.submit(_get_range, key, a, b - 1)))
+            if len(pending) >= workers:
+                break
+        while pending:
+            a, b, fut = pending.popleft()
+            raw = fut.result()
+            nxt = next(spans, None)
+            if nxt:
+                pending.append((*nxt, pool.submit(_get_range, key, nxt[0], nxt[1] - 1)))
+            entry = {"start": a, "end": b, "rows": 0}
+            if ranges is not None:
+                ranges.append(entry)
+            for r in _parse_range(raw, headers):
+                entry["rows"] += 1
+                yield r
+
+class _OffsetChunk(list):
+    """Rows plus `end`: byte offset right after the last line they came from (for compressed
+    or Parquet input, rows of the file consumed so far)."""
+    end = 0
+
+class _OffsetBatch:
+    """RecordBatch plus `end`, the _OffsetChunk counterpart for Parquet input."""
+    def __init__(self, batch: pa.RecordBatch, end: int):
+        self.batch, self.end = batch, end
+
+    def __len__(self) -> int:
+        return self.batch.num_rows
+
+def _iter_stream_chunks(key: str, start: int, rows_per_chunk: int,
+                        limit: Optional[int] = None) -> Iterator[_OffsetChunk]:
+    """Compressed CSV has no usable byte offsets: the stream is decompressed from the beginning
+    and the first `start` rows are skipped; `end` counts rows."""
+    rows = itertools.islice(_iter_employees_from_s3(key), start, None if limit is None else start + limit)
+    end = start
+    for rows_ in _chunked(rows, rows_per_chunk):
+        end += len(rows_)
+        chunk = _OffsetChunk(rows_)
+        chunk.end = end
+        yield chunk
+
+def _iter_csv_records(key: str, start: int, size: int, readers: int = 1,
+                      etag: Optional[str] = None) -> Iterator[Tuple[bytes, int]]:
+    """Non-empty CSV records from byte `start` (a record start) on, each with the offset right after
+    it. RANGE_BYTES ranges are fetched in file order, up to `readers` at a time. A record ends at a
+    newline outside a quoted field; like the csv module, only a quote at the start of a field opens
+    one, so quoted fields may hold newlines and every offset yielded is a safe place to resume from.
+    With `etag` the ranges are read from that object version only."""
+    with ThreadPoolExecutor(max_workers=max(1, readers), thread_name_prefix="s3-range") as pool:
+        fetch  = lambda a: pool.submit(_get_range, key, a, min(a + RANGE_BYTES, size) - 1, etag)
+        starts = iter(range(start, size, RANGE_BYTES))
+        pending = deque(fetch(a) for a in itertools.islice(starts, max(1, readers)))
+        carry, base = b"", start
+        while pending:
+            buf = carry + pending.popleft().result()
+            nxt = next(starts, None)
+            if nxt is not None:
+                pending.append(fetch(nxt))
+            i = j = 0   # i: inicio del registro, j: posición de búsqueda
+            quoted = False
+            while (k := buf.find(b"\n", j)) >= 0:
+                p = buf.find(b'"', j, k)
+                while p >= 0:
+                    if quoted:
+                        if buf[p + 1:p + 2] == b'"':
+                            p += 1            # "" escapada
+                        else:
+                            quoted = False
+                    elif p == i or buf[p - 1:p] == b",":
+                        quoted = True         # sólo abre comillas al inicio de un campo (O"Brien no)
+                    p = buf.find(b'"', p + 1, k)
+                j = k + 1
+                if quoted:
+                    continue   # salto de línea dentro de comillas
+                rec = buf[i:k].rstrip(b"\r")
+                if rec:
+                    yield rec, base + j
+                i = j
+            carry, base = buf[i:], base + i
+            if len(carry) > MAX_RECORD_BYTES:
+                raise ValueError(f"{key}: record at byte {base} is longer than MAX_RECORD_BYTES={MAX_RECORD_BYTES} "
+                                 "(unterminated quoted field?)")
+        if carry.rstrip(b"\r\n"):
+            yield carry.rstrip(b"\r\n"), size
+
+def _iter_offset_chunks(key: str, headers: List[str], start: int, size: int, rows_per_chunk: int,
+                        limit: Optional[int] = None, readers: int = 1, arrow: bool = False,
+                        etag: Optional[str] = None) -> Iterator[Any]:
+    """Rows from byte `start` on, `rows_per_chunk` at a time, each chunk ending at a record boundary
+    (`end`): _OffsetChunk of dicts, or _OffsetBatch parsed by pyarrow if `arrow`. Stops after
+    `limit` rows."""
+    records = _iter_csv_records(key, start, size, readers, etag)
+    for group in _chunked(itertools.islice(records, limit), rows_per_chunk):
+        end = group[-1][1]
+        if arrow:
+            yield _OffsetBatch(_arrow_csv_block(b"\n".join(r for r, _ in group), headers), end)
+            continue
+        chunk = _OffsetChunk()
+        for rec, _ in group:
+            vals = next(csv.reader([rec.decode("utf-8", errors="replace")]), [])
+            chunk.append({h: (vals[k].strip() if k < len(vals) else "") for k, h in enumerate(headers)})
+        chunk.end = end
+        yield chunk
+
+def _arrow_csv_options(headers: List[str], odd: List[Dict[str, str]]) -> Dict[str, Any]:
+    """pyarrow CSV options: every column as string, quoted newlines allowed, and rows with a wrong
+    field count padded/truncated like DictReader would and collected in `odd`."""
+    def _on_invalid(row) -> str:
+        vals = next(csv.reader([row.text]), [])
+        odd.append({h: (vals[i] if i < len(vals) else "") for i, h in enumerate(headers)})
+        return "skip"
+
+    return dict(
+        read_options=pacsv.ReadOptions(column_names=headers, block_size=ARROW_BLOCK_BYTES),
+        parse_options=pacsv.ParseOptions(newlines_in_values=True, invalid_row_handler=_on_invalid),
+        convert_options=pacsv.ConvertOptions(column_types=dict(zip(headers, [pa.string()] * len(headers)))),
+    )
+
+def _arrow_csv_block(data: bytes, headers: List[str]) -> pa.RecordBatch:
+    """Header-less CSV bytes holding whole records -> one all-string RecordBatch."""
+    odd: List[Dict[str, str]] = []
+    tbl = pacsv.read_csv(pa.BufferReader(data), **_arrow_csv_options(headers, odd))
+    if odd:
+        tbl = pa.concat_tables([tbl, pa.Table.from_pylist(odd, tbl.schema)])
+    batches = tbl.combine_chunks().to_batches()
+    return batches[0] if batches else pa.RecordBatch.from_pylist([], tbl.schema)
+
+def _iter_employee_batches_arrow(key: str) -> Iterator[pa.RecordBatch]:
+    """Streams the CSV as all-string RecordBatches with normalized column names.
+
+    Rows with a wrong field count are padded/truncated like DictReader would and appended
+    to the next batch, so they still reach validation.
+    """
+    stream = _open_raw(key)
+    first  = stream.readline().decode("utf-8-sig", errors="replace").rstrip("\r\n")
+    if not first:
+        return
+    if not stream.peek(1):
+        return   # sólo el encabezado: open_csv fallaría con "Empty CSV file"
+    headers = [_normalize(h) for h in next(csv.reader([first]), [])]
+    odd: List[Dict[str, str]] = []
+    schema = pa.schema([(h, pa.string()) for h in headers])
+    reader = pacsv.open_csv(stream, **_arrow_csv_options(headers, odd))
+    for batch in reader:
+        if odd:
+            extra, odd[:] = odd[:], []
+            batch = pa.Table.from_batches([batch, pa.RecordBatch.from_pylist(extra, schema)]).combine_chunks().to_batches()[0]
+        yield batch
+    if odd:
+        yield pa.RecordBatch.from_pylist(odd, schema)
+
 def _parse_dt(s: str):
     if not s or s.strip()=="":
         return None
@@ -61,182 +338,678 @@ def _parse_dt(s: str):
     except Exception:
         return None
 
-def _chunks(lst: List[Dict[str, Any]], size: int) -> Iterable[List[Dict[str, Any]]]:
-    for i in range(0, len(lst), size):
-        yield lst[i:i+size]
-
-def _write_errors_csv_to_s3(file_tag: str, rows: List[Dict[str, Any]]) -> str:
-    if not rows:
-        return ""
-    key = f"{BACKUP_PREFIX.rstrip('/')}/errors/{file_tag}-{uuid.uuid4().hex}.csv"
-    buf = io.StringIO()
-    headers = sorted({k for r in rows for k in r.keys() if k != "_reason"})
-    writer = csv.writer(buf)
-    writer.writerow(headers + ["reason"])
-    for r in rows:
-        writer.writerow([r.get(h, "") for h in headers] + [r.get("_reason","")])
-    s3.put_object(Bucket=BUCKET, Key=key, Body=buf.getvalue().encode("utf-8"))
-    return key
-
-def _write_errors_jsonl_to_s3(file_tag: str, rows: List[Dict[str, Any]]) -> str:
-    if not rows:
-        return ""
-    ts  = datetime.datetime.utcnow().strftime("%Y%m%dT%H%M%S")
-    key = f"{BACKUP_PREFIX.rstrip('/')}/errors/{file_tag}-{ts}.jsonl"
-    b   = io.BytesIO()
-    for r in rows:
-        b.write((json.dumps(r, ensure_ascii=False) + "\n").encode("utf-8"))
-    s3.put_object(Bucket=BUCKET, Key=key, Body=b.getvalue())
-    return key
-
-def _audit(file_name: str, table: str, total: int, valid: int, invalid: int, err_key: str, batch_size: int):
+def _audit(file_name: str, table: str, total: int, valid: int, invalid: int, err_key: str, batch_size: int,
+           stages: Optional[Dict[str, Any]] = None, etag: Optional[str] = None, size: Optional[int] = None):
+    """One row per finished load. `etag`/`size` are set only when the whole object was read and no
+    row was rejected for a catalog miss, so a row with an etag means that version of the file is
+    fully loaded (prefix ingests skip it)."""
     with engine.begin() as conn:
         conn.execute(text("""
-            INSERT INTO app.ingest_audit (file_name, table_target, total_read, valid_rows, invalid_rows, batch_size, error_s3_key)
-            VALUES (:f, :t, :tr, :vr, :ir, :bs, :ek)
-        """), {"f": file_name, "t": table, "tr": total, "vr": valid, "ir": invalid, "bs": batch_size, "ek": err_key})
+            INSERT INTO app.ingest_audit (file_name, table_target, total_read, valid_rows, invalid_rows, batch_size, error_s3_key,
+                                          stages, etag, size_bytes)
+            VALUES (:f, :t, :tr, :vr, :ir, :bs, :ek, CAST(:st AS jsonb), :et, :sz)
+        """), {"f": file_name, "t": table, "tr": total, "vr": valid, "ir": invalid, "bs": batch_size, "ek": err_key,
+               "st": json.dumps(stages) if stages else None, "et": etag, "sz": size})
+    watermark.bump()
+
+# ---------- departments / jobs ----------
+def _ingest_catalog(table: str, file_name: str, err_tag: str) -> Dict[str, Any]:
+    """Streams an (id, name) catalog CSV and inserts it in BATCH_SIZE chunks while reading."""
+    key = f"{RAW_PREFIX.rstrip('/')}/" + file_name
+    sql = text(f"""INSERT INTO app.{table} (id, name)
+                   VALUES (:id, :name)
+                   ON CONFLICT (id) DO NOTHING""")
+    read = valid = invalid = inserted = 0
+    batch: List[Dict[str, Any]] = []
+    s_read, s_val, s_write = (_StageStats(st, table) for st in ("read", "validate", "write"))
+    busy = {"read": 0.0, "write": 0.0}
+    t0 = time.perf_counter()
+    with ErrorSink(err_tag) as sink, engine.begin() as conn:
+        rows = _iter_parquet_rows(key) if _raw_format(key) == "parquet" else \
+               _iter_csv_from_s3(key, expected_headers=["id","name"])
+        while True:
+            t = time.perf_counter()
+            r = next(rows, None)
+            busy["read"] += time.perf_counter() - t
+            if r is None:
+                break
+            read += 1
+            if not r.get("id"):
+                r["_reason"]="missing id"
+            elif not r.get("name"):
+                r["_reason"]="missing name"
+            else:
+                try:
+                    rid = int(r["id"])
+                except:
+                    r["_reason"]="id not integer"
+            if "_reason" in r:
+                invalid += 1; sink.write([r]); continue
+            valid += 1
+            batch.append({"id": rid, "name": r["name"].strip()})
+            if len(batch) >= BATCH_SIZE:
+                inserted += _write_catalog_batch(conn, table, sql, batch, busy); batch = []
+        if batch:
+            inserted += _write_catalog_batch(conn, table, sql, batch, busy)
+    wall = time.perf_counter() - t0
+    # una sola transacción: el tiempo por etapa se acumula y se registra una vez por archivo
+    s_read.add(read, busy["read"])
+    s_write.add(inserted, busy["write"])
+    s_val.add(read, max(0.0, wall - busy["read"] - busy["write"]))
+    stages = {"read": s_read.report(wall), "validate": s_val.report(wall), "write": s_write.report(wall)}
+    catalog.invalidate()
+    err_key = sink.close()
+    _audit(file_name, f"app.{table}", read, valid, invalid, err_key, BATCH_SIZE, stages)
+    return {"file": key, "read": read, "valid": valid, "invalid": invalid,
+            "batch_size": BATCH_SIZE, "attempted": inserted, "errors_s3": err_key or None, "stages": stages}
+
+def _write_catalog_batch(conn, table: str, sql, batch: List[Dict[str, Any]], busy: Dict[str, float]) -> int:
+    t = time.perf_counter()
+    conn.execute(sql, batch)
+    dt = time.perf_counter() - t
+    busy["write"] += dt
+    instrument.DB_BATCH_SECONDS.observe(dt, path="catalog", table=table)
+    instrument.DB_BATCH_ROWS.inc(len(batch), path="catalog", table=table)
+    return len(batch)
 
-# ---------- departments ----------
 def ingest_departments() -> Dict[str, Any]:
-    key  = f"{RAW_PREFIX.rstrip('/')}/" + DEPARTMENTS_FILE
-    rows = _read_csv_from_s3(key, expected_headers=["id","name"])
-    good, bad = [], []
-    for r in rows:
-        if not r.get("id"):
-            r["_reason"]="missing id"; bad.append(r); continue
-        if not r.get("name"):
-            r["_reason"]="missing name"; bad.append(r); continue
-        try:
-            rid = int(r["id"])
-        except:
-            r["_reason"]="id not integer"; bad.append(r); continue
-        good.append({"id": rid, "name": r["name"].strip()})
-    sql = text("""INSERT INTO app.departments (id, name)
-                  VALUES (:id, :name)
-                  ON CONFLICT (id) DO NOTHING""")
-    inserted = 0
-    with engine.begin() as conn:
-        for batch in _chunks(good, BATCH_SIZE):
-            conn.execute(sql, batch); inserted += len(batch)
-    err_key = _write_errors_csv_to_s3("departments_errors", bad)
-    _audit(DEPARTMENTS_FILE, "app.departments", len(rows), len(good), len(bad), err_key, BATCH_SIZE)
-    return {"file": key, "read": len(rows), "valid": len(good), "invalid": len(bad),
-            "batch_size": BATCH_SIZE, "attempted": inserted, "errors_s3": err_key or None}
-
-# ---------- jobs ----------
+    return _ingest_catalog("departments", DEPARTMENTS_FILE, "departments_errors")
+
 def ingest_jobs() -> Dict[str, Any]:
-    key  = f"{RAW_PREFIX.rstrip('/')}/" + JOBS_FILE
-    rows = _read_csv_from_s3(key, expected_headers=["id","name"])
+    return _ingest_catalog("jobs", JOBS_FILE, "jobs_errors")
+
+# ---------- employees ----------
+def _validate_employee(r: Dict[str, Any], dept_ids, job_ids) -> Optional[Dict[str, Any]]:
+    """Returns the row ready to insert, or None after setting r["_reason"]."""
+    dep_val = r.get("department_id") or r.get("department") or r.get("departmer")
+    dt_raw  = r.get("datetime") or r.get("dt")
+    missing = [c for c in ("id","name","job_id") if not r.get(c)]
+    if missing or not dep_val or not dt_raw:
+        missing2 = []
+        if not dep_val: missing2.append("department")
+        if not dt_raw:  missing2.append("datetime")
+        r["_reason"] = "missing fields: " + ",".join(missing + missing2)
+        return None
+    try:
+        rid  = int(r["id"]); rjob = int(r["job_id"]); rdep = int(dep_val)
+    except Exception:
+        r["_reason"]="id/department/job_id not integer"; return None
+    dt_val = _parse_dt(dt_raw)
+    if dt_val is None:
+        r["_reason"]="invalid datetime"; return None
+    if rdep not in dept_ids:
+        r["_reason"]=f"department {rdep} not in catalog"; return None
+    if rjob not in job_ids:
+        r["_reason"]=f"job_id {rjob} not in catalog"; return None
+    return {
+        "id": rid,
+        "name": r["name"].strip(),
+        "dt": dt_val,          # usa .date() si la columna es DATE
+        "department_id": rdep,
+        "job_id": rjob,
+    }
+
+def _not_in_catalog(r: Dict[str, Any]) -> bool:
+    return r.get("_reason", "").endswith(" not in catalog")
+
+def _validate_rows(rows: List[Dict[str, Any]], cat: catalog.CatalogSnapshot) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """Validates a chunk; catalog misses trigger one catalog refresh and are re-checked before rejecting."""
     good, bad = [], []
     for r in rows:
-        if not r.get("id"):
-            r["_reason"]="missing id"; bad.append(r); continue
-        if not r.get("name"):
-            r["_reason"]="missing name"; bad.append(r); continue
+        row = _validate_employee(r, cat.departments, cat.jobs)
+        if row is None: bad.append(r)
+        else:           good.append(row)
+    if any(_not_in_catalog(r) for r in bad):
+        newer = catalog.refresh_on_miss(cat)
+        if newer.departments != cat.departments or newer.jobs != cat.jobs:
+            retry = [r for r in bad if _not_in_catalog(r)]
+            bad   = [r for r in bad if not _not_in_catalog(r)]
+            for r in retry:
+                del r["_reason"]
+                row = _validate_employee(r, newer.departments, newer.jobs)
+                if row is None: bad.append(r)
+                else:           good.append(row)
+    return good, bad
+
+# Fast path del engine arrow: valores que el cast/strptime vectorizado interpreta igual que Python.
+# Todo lo demás (p.ej. "+5", "2021-1-5", fechas con fracción) se valida con _validate_employee.
+_INT_RE = r"^-?[0-9]{1,18}$"
+_DT_RE  = r"^[1-9][0-9]{3}-[0-9]{2}-[0-9]{2}([ T][0-9]{2}:[0-9]{2}:[0-9]{2})?Z?$"
+_NULL_STR = pa.scalar(None, pa.string())
+
+_ARROW_IDS: Dict[int, Tuple[pa.Array, pa.Array]] = {}
+
+def _arrow_ids(cat: catalog.CatalogSnapshot) -> Tuple[pa.Array, pa.Array]:
+    ids = _ARROW_IDS.get(cat.version)
+    if ids is None:
+        _ARROW_IDS.clear()
+        ids = _ARROW_IDS[cat.version] = (pa.array(sorted(cat.departments), pa.int64()),
+                                         pa.array(sorted(cat.jobs), pa.int64()))
+    return ids
+
+_MISSING_ORDER = ("id", "name", "job_id", "department", "datetime")   # orden de "missing fields: ..."
+
+def _missing_rows(tb: pa.RecordBatch, empty: Dict[str, pa.Array], missing: pa.Array) -> List[Dict[str, Any]]:
+    if not pc.any(missing).as_py():
+        return []
+    # se arma sólo sobre las filas con faltantes: join con null_handling="skip" no admite filas todo-null
+    fields = [pc.if_else(empty[f].filter(missing), f, _NULL_STR) for f in _MISSING_ORDER]
+    reason = pc.binary_join_element_wise("missing fields: ", pc.binary_join_element_wise(*fields, ",", null_handling="skip"), "")
+    return tb.filter(missing).append_column("_reason", reason).to_pylist()
+
+def _split_catalog(tb: pa.RecordBatch, rid: pa.Array, name: pa.Array, ts: pa.Array, dep: pa.Array, job: pa.Array,
+                   cat: catalog.CatalogSnapshot) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """Typed, complete rows -> (insertable rows, rows whose department/job is not in the catalog)."""
+    dept_arr, job_arr = _arrow_ids(cat)
+    dep_ok = pc.is_in(dep, value_set=dept_arr)
+    job_ok = pc.is_in(job, value_set=job_arr)
+    if not pc.all(pc.and_(dep_ok, job_ok)).as_py():
+        newer = catalog.refresh_on_miss(cat)
+        if newer.departments != cat.departments or newer.jobs != cat.jobs:
+            dept_arr, job_arr = _arrow_ids(newer)
+            dep_ok = pc.is_in(dep, value_set=dept_arr)
+            job_ok = pc.is_in(job, value_set=job_arr)
+    ok, bad = pc.and_(dep_ok, job_ok), []
+    if not pc.all(ok).as_py():
+        reason = pc.if_else(dep_ok,
+                            pc.binary_join_element_wise("job_id ", pc.cast(job, pa.string()), " not in catalog", ""),
+                            pc.binary_join_element_wise("department ", pc.cast(dep, pa.string()), " not in catalog", ""))
+        bad = tb.append_column("_reason", reason).filter(pc.invert(ok)).to_pylist()
+    good = pa.RecordBatch.from_arrays([rid, name, pc.cast(ts, pa.timestamp("us")), dep, job],
+                                      names=list(EMPLOYEE_COLS)).filter(ok).to_pylist()
+    return good, bad
+
+def _validate_batch_typed(batch: pa.RecordBatch, cat: catalog.CatalogSnapshot) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """Batches with typed columns (Parquet input). Integer ids, a string name and a timestamp/date
+    column are validated as they are, with no round trip through text; any other layout is cast to
+    strings column by column and goes through the all-string path."""
+    names = batch.schema.names
+    pick  = lambda *cands: next((batch.column(c) for c in cands if c in names), None)
+    rid, name, rjob = pick("id"), pick("name"), pick("job_id")
+    rdep, rdt = pick("department_id", "department", "departmer"), pick("datetime", "dt")
+    typed = (all(c is not None and pa.types.is_integer(c.type) for c in (rid, rjob, rdep))
+             and name is not None and pa.types.is_string(name.type)
+             and rdt is not None and (pa.types.is_timestamp(rdt.type) or pa.types.is_date(rdt.type)))
+    if not typed:
+        def as_str(c: pa.Array) -> pa.Array:
+            if pa.types.is_timestamp(c.type) or pa.types.is_date(c.type):
+                c = pc.strftime(c, "%Y-%m-%d %H:%M:%S")
+            return pc.fill_null(pc.cast(c, pa.string()), "")
+        return _validate_batch_arrow(pa.RecordBatch.from_arrays([as_str(c) for c in batch.columns], names=names), cat)
+
+    name = pc.utf8_trim_whitespace(name)
+    empty = {"id": pc.is_null(rid), "name": pc.fill_null(pc.equal(name, ""), True), "job_id": pc.is_null(rjob),
+             "department": pc.is_null(rdep), "datetime": pc.is_null(rdt)}
+    missing = empty["id"]
+    for f in _MISSING_ORDER[1:]:
+        missing = pc.or_(missing, empty[f])
+    bad = _missing_rows(batch, empty, missing)
+    ok = pc.invert(missing)
+    good, rejected = _split_catalog(batch.filter(ok), pc.cast(rid.filter(ok), pa.int64()), name.filter(ok),
+                                    rdt.filter(ok), pc.cast(rdep.filter(ok), pa.int64()), pc.cast(rjob.filter(ok), pa.int64()), cat)
+    return good, bad + rejected
+
+def _validate_batch_arrow(batch: pa.RecordBatch, cat: catalog.CatalogSnapshot) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """Vectorized _validate_rows over one all-string batch: same rows, same `_reason` strings.
+    Batches with other column types are handed to _validate_batch_typed."""
+    if not all(pa.types.is_string(t) for t in batch.schema.types):
+        return _validate_batch_typed(batch, cat)
+    names = batch.schema.names
+    tb = pa.RecordBatch.from_arrays([pc.utf8_trim_whitespace(c) for c in batch.columns], names=names)
+    blank = pa.array([""] * tb.num_rows, pa.string())
+
+    def first_filled(*cands):
+        out = None
+        for c in cands:
+            if c in names:
+                out = tb.column(c) if out is None else pc.if_else(pc.equal(out, ""), tb.column(c), out)
+        return blank if out is None else out
+
+    rid, name, rjob = first_filled("id"), first_filled("name"), first_filled("job_id")
+    rdep = first_filled("department_id", "department", "departmer")
+    rdt  = first_filled("datetime", "dt")
+
+    empty = {f: pc.equal(v, "") for f, v in
+             (("id", rid), ("name", name), ("job_id", rjob), ("department", rdep), ("datetime", rdt))}
+    missing = pc.or_(pc.or_(pc.or_(empty["id"], empty["name"]), pc.or_(empty["job_id"], empty["department"])), empty["datetime"])
+
+    # fechas: "YYYY-MM-DD[( |T)HH:MM:SS][Z]" con ida y vuelta exacta (strptime de arrow normaliza 02-30 -> 03-02)
+    dt_s  = pc.replace_substring(pc.replace_substring_regex(rdt, "Z$", ""), "T", " ")
+    ts_dt = pc.strptime(dt_s, "%Y-%m-%d %H:%M:%S", "s", error_is_null=True)
+    ts_d  = pc.strptime(dt_s, "%Y-%m-%d", "s", error_is_null=True)
+    ts    = pc.coalesce(ts_dt, ts_d)
+    same  = pc.equal(pc.if_else(pc.is_valid(ts_dt), pc.strftime(ts, "%Y-%m-%d %H:%M:%S"), pc.strftime(ts, "%Y-%m-%d")), dt_s)
+    fast  = pc.and_kleene(pc.and_kleene(pc.match_substring_regex(rid, _INT_RE), pc.match_substring_regex(rjob, _INT_RE)),
+                          pc.and_kleene(pc.match_substring_regex(rdep, _INT_RE), pc.match_substring_regex(rdt, _DT_RE)))
+    fast  = pc.fill_null(pc.and_kleene(pc.and_not(fast, missing), same), False)
+    slow  = pc.and_not(pc.invert(fast), missing)
+
+    bad = _missing_rows(tb, empty, missing)
+
+    good: List[Dict[str, Any]] = []
+    if pc.any(slow).as_py():
+        g, b = _validate_rows(tb.filter(slow).to_pylist(), cat)
+        good += g; bad += b
+
+    if pc.any(fast).as_py():
+        g, b = _split_catalog(tb.filter(fast), pc.cast(rid.filter(fast), pa.int64()), name.filter(fast), ts.filter(fast),
+                              pc.cast(rdep.filter(fast), pa.int64()), pc.cast(rjob.filter(fast), pa.int64()), cat)
+        good += g; bad += b
+    return good, bad
+
+# un solo statement por lote: cada columna viaja como array y el resultado trae una fila por id insertado;
+# en employees, with_rollup suma al rollup sólo lo insertado
+UNNEST_INSERT_SQL = {
+    "departments": text("""INSERT INTO app.departments (id, name)
+                           SELECT * FROM unnest(CAST(:id AS int[]), CAST(:name AS text[]))
+                           ON CONFLICT (id) DO NOTHING RETURNING id"""),
+    "jobs":        text("""INSERT INTO app.jobs (id, name)
+                           SELECT * FROM unnest(CAST(:id AS int[]), CAST(:name AS text[]))
+                           ON CONFLICT (id) DO NOTHING RETURNING id"""),
+    "employees":   text(with_rollup("""
+                           INSERT INTO app.employees (id, name, dt, department_id, job_id)
+                           SELECT * FROM unnest(CAST(:id AS int[]), CAST(:name AS text[]), CAST(:dt AS timestamp[]),
+                                                CAST(:department_id AS int[]), CAST(:job_id AS int[]))
+                           ON CONFLICT (id) DO NOTHING""")),
+}
+
+def _write_employees(conn, batch: List[Dict[str, Any]], mode: str) -> int:
+    if mode == "copy":
+        return copy_merge(conn, "employees", EMPLOYEE_COLS,
+                          ([r[c] for c in EMPLOYEE_COLS] for r in batch), wrap=with_rollup)
+    res = conn.execute(UNNEST_INSERT_SQL["employees"], {c: [r[c] for r in batch] for c in EMPLOYEE_COLS})
+    return res.rowcount if res.rowcount is not None else 0
+
+# --- pipeline: reader thread -> validator (caller thread) -> N writer threads ---
+_DONE = object()
+_write_slots = threading.BoundedSemaphore(WRITE_SLOTS)
+
+class _StageStats:
+    """Rows handled and busy seconds of one pipeline stage, shared by its workers; every add()
+    also feeds the process-wide apidata_ingest_stage_* metrics."""
+    def __init__(self, stage: str, table: str = "employees", workers: int = 1):
+        self.stage, self.table = stage, table
+        self.workers = workers
+        self.rows = 0
+        self.out  = 0      # filas efectivamente producidas (p.ej. insertadas)
+        self.busy = 0.0
+        self.wait = 0.0    # espera de conexión del pool (etapa write)
+        self._lock = threading.Lock()
+
+    def add(self, rows: int, busy: float, out: int = 0, wait: float = 0.0):
+        with self._lock:
+            self.rows += rows; self.busy += busy; self.out += out; self.wait += wait
+        instrument.STAGE_SECONDS.observe(busy, table=self.table, stage=self.stage)
+        instrument.STAGE_ROWS.inc(rows, table=self.table, stage=self.stage)
+
+    def report(self, wall: float) -> Dict[str, Any]:
+        out = {
+            "workers": self.workers, "rows": self.rows, "busy_sec": round(self.busy, 2),
+            "rows_per_sec": round(self.rows * self.workers / self.busy, 1) if self.busy else None,
+            "utilization": round(self.busy / (wall * self.workers), 2) if wall else None,
+        }
+        if self.stage == "write":
+            out["pool_wait_sec"] = round(self.wait, 3)
+        return out
+
+def _put(q: "queue.Queue", item, stop: threading.Event) -> bool:
+    while not stop.is_set():
         try:
-            rid = int(r["id"])
-        except:
-            r["_reason"]="id not integer"; bad.append(r); continue
-        good.append({"id": rid, "name": r["name"].strip()})
-    sql = text("""INSERT INTO app.jobs (id, name)
-                  VALUES (:id, :name)
-                  ON CONFLICT (id) DO NOTHING""")
-    inserted = 0
-    with engine.begin() as conn:
-        for batch in _chunks(good, BATCH_SIZE):
-            conn.execute(sql, batch); inserted += len(batch)
-    err_key = _write_errors_csv_to_s3("jobs_errors", bad)
-    _audit(JOBS_FILE, "app.jobs", len(rows), len(good), len(bad), err_key, BATCH_SIZE)
-    return {"file": key, "read": len(rows), "valid": len(good), "invalid": len(bad),
-            "batch_size": BATCH_SIZE, "attempted": inserted, "errors_s3": err_key or None}
+            q.put(item, timeout=0.2); return True
+        except queue.Full:
+            continue
+    return False
+
+def _get(q: "queue.Queue", stop: threading.Event):
+    while not stop.is_set():
+        try:
+            return q.get(timeout=0.2)
+        except queue.Empty:
+            continue
+    return _DONE
+
+def _chunked(rows: Iterable[Dict[str, Any]], size: int) -> Iterator[List[Dict[str, Any]]]:
+    it = iter(rows)
+    while chunk := list(itertools.islice(it, size)):
+        yield chunk
+
+def _read_stage(chunks: Iterable, limit: Optional[int],
+                out_q: "queue.Queue", stop: threading.Event, stats: _StageStats, errors: list):
+    """Feeds chunks (row lists or RecordBatches) to out_q, cutting the last one at `limit` rows."""
+    try:
+        n, t = 0, time.perf_counter()
+        for c in chunks:
+            if limit is not None and n + len(c) > limit:
+                c = c[:limit - n]
+            n += len(c)
+            stats.add(len(c), time.perf_counter() - t)
+            if not _put(out_q, c, stop):
+                return
+            t = time.perf_counter()
+            if limit is not None and n >= limit:
+                break
+    except Exception as e:
+        errors.append(e); stop.set()
+    finally:
+        _put(out_q, _DONE, stop)
+
+class _Checkpointer:
+    """Turns out-of-order batch commits into a resumable source offset: a mark (offset, counters)
+    is saved through job.save() once every batch issued before it has committed. `inserted` may
+    include rows past the offset; re-reading them after a resume inserts nothing, so totals hold."""
+    def __init__(self, job, base: Dict[str, Any]):
+        self.job = job
+        self.saved = dict(base)
+        self.inserted = base.get("inserted", 0)
+        self.issued = self.low = 0
+        self.done: Dict[int, int] = {}
+        self.marks: deque = deque()
+        self._lock = threading.Lock()
+
+    def issue(self) -> int:
+        with self._lock:
+            self.issued += 1
+            return self.issued - 1
+
+    def mark(self, offset: int, counters: Dict[str, int], buffered: bool):
+        """All rows before `offset` are validated; the valid ones are in issued batches, plus
+        (if `buffered`) in the next one to be issued."""
+        with self._lock:
+            self.marks.append((self.issued if buffered else self.issued - 1, offset, counters))
+            self._advance()
+
+    def commit(self, seq: int, inserted: int):
+        with self._lock:
+            self.done[seq] = inserted
+            self._advance()
+
+    def _advance(self):
+        while self.low in self.done:
+            self.inserted += self.done.pop(self.low)
+            self.low += 1
+        latest = None
+        while self.marks and self.marks[0][0] < self.low:
+            latest = self.marks.popleft()
+        if latest:
+            _, offset, counters = latest
+            self.saved = {**self.saved, **counters, "offset": offset, "inserted": self.inserted}
+            self.job.save(self.saved)
+
+def _write_stage(mode: str, in_q: "queue.Queue", stop: threading.Event,
+                 stats: _StageStats, errors: list, ckpt: Optional[_Checkpointer] = None):
+    while True:
+        item = _get(in_q, stop)
+        if item is _DONE:
+            return
+        seq, batch = item
+        t = time.perf_counter()
+        try:
+            with _write_slots, engine.begin() as conn:
+                waited = time.perf_counter() - t   # cupo de escritura + checkout del pool
+                n = _write_employees(conn, batch, mode)
+            if ckpt:
+                ckpt.commit(seq, n)
+        except Exception as e:
+            errors.append(e); stop.set(); return
+        busy = time.perf_counter() - t
+        stats.add(len(batch), busy, n, wait=waited)
+        instrument.DB_BATCH_SECONDS.observe(busy, path="ingest", mode=mode)
+        instrument.DB_BATCH_ROWS.inc(len(batch), path="ingest", mode=mode)
+        if n:
+            watermark.bump()
 
-# ---------- employees ----------
 def ingest_employees(limit: Optional[int] = None,
                      batch_size: Optional[int] = None,
-                     progress_every: int = 10000) -> Dict[str, Any]:
-    key = f"{RAW_PREFIX.rstrip('/')}/" + EMPLOYEES_FILE
+                     progress_every: int = 10000,
+                     mode: str = "insert",
+                     writers: Optional[int] = None,
+                     readers: Optional[int] = None,
+                     validator: str = "python",
+                     job=None,
+                     file: Optional[str] = None,
+                     obj: Optional[Dict[str, Any]] = None,
+                     prefilter: Any = False) -> Dict[str, Any]:   # True o un IdRanges ya cargado
+    """Loads EMPLOYEES_FILE, or `file` under RAW_PREFIX; formats, jobs, readers, validators and
+    prefilter are described in the README. `obj` is the listing entry (ETag, Size) if the caller has it."""
+    if mode not in INGEST_MODES:
+        raise ValueError(f"mode must be one of {INGEST_MODES}")
+    if validator not in VALIDATORS:
+        raise ValueError(f"validator must be one of {VALIDATORS}")
+    file = file or EMPLOYEES_FILE
+    key = f"{RAW_PREFIX.rstrip('/')}/" + file
+    if obj is None and (limit is None or job):
+        head = s3.head_object(Bucket=BUCKET, Key=key)
+        obj  = {"ETag": head["ETag"], "Size": head["ContentLength"]}
+    version = obj["ETag"].strip('"') if obj else None
+    etag, size = (version, obj["Size"]) if limit is None else (None, None)
+    fmt = _raw_format(key)
+    if fmt == "parquet":
+        validator = "arrow"
+    if readers and readers > 1:
+        if fmt != "csv":
+            raise ValueError("readers > 1 needs an uncompressed CSV")
+        if validator == "arrow" and job is None:
+            raise ValueError("readers > 1 with validator=arrow needs a job (wait=false)")
     bs  = int(batch_size or BATCH_SIZE)
+    nw  = max(1, min(int(writers or INGEST_WRITERS), MAX_WRITERS))
 
-    with engine.begin() as conn:
-        dept_ids = {row[0] for row in conn.execute(text("SELECT id FROM app.departments"))}
-        job_ids  = {row[0] for row in conn.execute(text("SELECT id FROM app.jobs"))}
-
-    insert_sql = text("""
-        INSERT INTO app.employees (id, name, dt, department_id, job_id)
-        VALUES (:id, :name, :dt, :department_id, :job_id)
-        ON CONFLICT (id) DO NOTHING
-    """)
+    catalog.get()   # carga (o reutiliza) el catálogo antes de arrancar los hilos
+    existing = id_ranges.load() if prefilter is True else (prefilter or None)
 
-    read = valid = invalid = inserted = 0
-    bad: List[Dict[str, Any]] = []
+    cp = dict(job.checkpoint) if job else {}
+    if job and cp.get("etag") != version:
+        # el offset es de otra versión del objeto (se volvió a subir): se empieza de cero
+        cp = {"etag": version}
+    base_read, base_valid, base_invalid, base_ins = (cp.get(k, 0) for k in ("read", "valid", "invalid", "inserted"))
+    read, valid, invalid = base_read, base_valid, base_invalid
+    skipped_existing = cp.get("skipped_existing", 0)
+    catalog_misses = cp.get("catalog_misses", 0)   # con faltantes de catálogo el ETag no se audita
+    ckpt = _Checkpointer(job, cp) if job else None
+    sink = ErrorSink("hired_employees_errors")
+    held: deque = deque()   # (offset, rechazadas) aún no cubiertas por el checkpoint; sólo en jobs
     batch: List[Dict[str, Any]] = []
     t0 = time.time()
 
-    for r in _iter_employees_from_s3(key):
-        read += 1
-
-        dep_val = r.get("department_id") or r.get("department") or r.get("departmer")
-        dt_raw  = r.get("datetime") or r.get("dt")
-        missing = [c for c in ("id","name","job_id") if not r.get(c)]
-        if missing or not dep_val or not dt_raw:
-            missing2 = []
-            if not dep_val: missing2.append("department")
-            if not dt_raw:  missing2.append("datetime")
-            r["_reason"] = "missing fields: " + ",".join(missing + missing2)
-            bad.append(r); invalid += 1
+    # colas acotadas: memoria ~ (QUEUE_DEPTH*2 + writers) lotes, independiente del archivo
+    raw_q: "queue.Queue" = queue.Queue(maxsize=QUEUE_DEPTH)
+    out_q: "queue.Queue" = queue.Queue(maxsize=QUEUE_DEPTH)
+    stop, errors = threading.Event(), []
+    s_read, s_val, s_write = _StageStats("read"), _StageStats("validate"), _StageStats("write", workers=nw)
+
+    ranges: List[Dict[str, int]] = []
+    if job and fmt == "parquet":
+        # offset = filas del archivo ya consumidas
+        left     = limit - base_read if limit else None
+        source   = (_OffsetBatch(b, end) for b, end in _iter_parquet_batches(key, cp.get("offset", 0), min(bs, 5000), left, version)) \
+                   if left is None or left > 0 else iter(())
+        validate = lambda chunk: _validate_batch_arrow(chunk.batch, catalog.get())
+    elif job and fmt == "csv":
+        # offset = byte de inicio del próximo registro; readers = rangos descargándose a la vez
+        left = limit - base_read if limit else None
+        headers, data_start, length = _read_header(key, version)
+        source = _iter_offset_chunks(key, headers, cp.get("offset", data_start), length, min(bs, 5000), left,
+                                     readers or 1, arrow=validator == "arrow", etag=version) \
+                 if left is None or left > 0 else iter(())
+        validate = (lambda chunk: _validate_batch_arrow(chunk.batch, catalog.get())) if validator == "arrow" else \
+                   (lambda chunk: _validate_rows(chunk, catalog.get()))
+    elif job:
+        left = limit - base_read if limit else None
+        source = _iter_stream_chunks(key, cp.get("offset", 0), min(bs, 5000), left) \
+                 if left is None or left > 0 else iter(())
+        if validator == "arrow":
+            validate = lambda chunk: _validate_batch_arrow(
+                pa.RecordBatch.from_pylist(chunk, pa.schema([(h, pa.string()) for h in chunk[0]])), catalog.get())
         else:
-            try:
-                rid  = int(r["id"]); rjob = int(r["job_id"]); rdep = int(dep_val)
-            except Exception:
-                r["_reason"]="id/department/job_id not integer"; bad.append(r); invalid += 1
+            validate = lambda chunk: _validate_rows(chunk, catalog.get())
+    elif fmt == "parquet":
+        source   = (b for b, _ in _iter_parquet_batches(key, limit=limit))
+        validate = lambda chunk: _validate_batch_arrow(chunk, catalog.get())
+    elif validator == "arrow":
+        source   = _iter_employee_batches_arrow(key)
+        validate = lambda chunk: _validate_batch_arrow(chunk, catalog.get())
+    else:
+        rows     = _iter_employees_ranged(key, readers, ranges) if readers and readers > 1 else _iter_employees_from_s3(key)
+        source   = _chunked(itertools.islice(rows, limit), min(bs, 5000))
+        validate = lambda chunk: _validate_rows(chunk, catalog.get())
+    reader = threading.Thread(target=_read_stage, name="ingest-read", daemon=True,
+                              args=(source, None if job else limit, raw_q, stop, s_read, errors))
+    workers = [threading.Thread(target=_write_stage, name=f"ingest-write-{i}", daemon=True,
+                                args=(mode, out_q, stop, s_write, errors, ckpt))
+               for i in range(nw)]
+    reader.start()
+    for w in workers: w.start()
+
+    try:
+        while True:
+            chunk = _get(raw_q, stop)
+            if chunk is _DONE:
+                break
+            t = time.perf_counter()
+            good, rejected = validate(chunk)
+            valid += len(good)
+            if existing is not None:
+                good, n = existing.drop_rows(good)
+                skipped_existing += n
+            s_val.add(len(chunk), time.perf_counter() - t)
+            prev = read
+            read += len(chunk); invalid += len(rejected)
+            catalog_misses += sum(1 for r in rejected if _not_in_catalog(r))
+            batch += good
+            while len(batch) >= bs and _put(out_q, (ckpt.issue() if ckpt else None, batch[:bs]), stop):
+                batch = batch[bs:]
+            if ckpt:
+                ckpt.mark(chunk.end, {"read": read, "valid": valid, "invalid": invalid, "skipped_existing": skipped_existing,
+                                      "catalog_misses": catalog_misses}, buffered=bool(batch))
+                job.progress(read=read, valid=valid, invalid=invalid, skipped_existing=skipped_existing,
+                             inserted=base_ins + s_write.out)
+                # al retomar se relee desde el checkpoint: sólo se emite lo que ya no se volverá a leer
+                held.append((chunk.end, rejected))
+                while held and held[0][0] <= ckpt.saved.get("offset", -1):
+                    sink.write(held.popleft()[1])
             else:
-                dt_val = _parse_dt(dt_raw)
-                if dt_val is None:
-                    r["_reason"]="invalid datetime"; bad.append(r); invalid += 1
-                elif rdep not in dept_ids:
-                    r["_reason"]=f"department {rdep} not in catalog"; bad.append(r); invalid += 1
-                elif rjob not in job_ids:
-                    r["_reason"]=f"job_id {rjob} not in catalog"; bad.append(r); invalid += 1
-                else:
-                    valid += 1
-                    batch.append({
-                        "id": rid,
-                        "name": r["name"].strip(),
-                        "dt": dt_val,          # usa .date() si la columna es DATE
-                        "department_id": rdep,
-                        "job_id": rjob,
-                    })
-
-        if batch and len(batch) >= bs:
-            with engine.begin() as conn:
-                res = conn.execute(insert_sql, batch)
-                inserted += res.rowcount if res.rowcount is not None else 0
-            batch.clear()
-
-        if read % progress_every == 0:
-            elapsed = time.time() - t0
-            msg = f"[employees] read={read} valid={valid} invalid={invalid} inserted={inserted} elapsed={elapsed:0.1f}s"
-            try: log.info(msg)
-            except Exception: print(msg)
-
-        if limit is not None and read >= limit:
-            break
-
-    if batch:
-        with engine.begin() as conn:
-            res = conn.execute(insert_sql, batch)
-            inserted += res.rowcount if res.rowcount is not None else 0
-        batch.clear()
-
-    err_key = ""
-    if bad:
-        err_key = _write_errors_jsonl_to_s3("hired_employees_errors", bad) if len(bad) > 10000 \
-                  else _write_errors_csv_to_s3("hired_employees_errors", bad)
-
-    _audit(EMPLOYEES_FILE, "app.employees", read, valid, invalid, err_key, bs)
+                sink.write(rejected)
 
-    return {
-        "file": key, "read": read, "valid": valid, "invalid": invalid,
-        "inserted": inserted, "batch_size": bs, "progress_every": progress_every,
-        "limit": limit, "errors_s3": err_key or None, "elapsed_sec": round(time.time() - t0, 2),
-    }
\ No newline at end of file
+            if read // progress_every > prev // progress_every:
+                elapsed = time.time() - t0
+                msg = (f"[employees] read={read} valid={valid} invalid={invalid} "
+                       f"inserted={s_write.out} elapsed={elapsed:0.1f}s")
+                try: log.info(msg)
+                except Exception: print(msg)
+
+        if batch and not stop.is_set():
+            _put(out_q, (ckpt.issue() if ckpt else None, batch), stop)
+    except Exception as e:
+        errors.append(e); stop.set()
+    finally:
+        for _ in workers: _put(out_q, _DONE, stop)
+        for w in workers: w.join()
+        stop.set(); reader.join()
+
+    if errors:
+        if ckpt:
+            while held and held[0][0] <= ckpt.saved.get("offset", -1):
+                sink.write(held.popleft()[1])
+            if sink.rows:
+                ckpt.saved["errors_s3"] = cp.get("errors_s3", []) + [sink.close()]
+                job.save(ckpt.saved)
+        else:
+            sink.abort()
+        raise errors[0]
+
+    for _, rejected in held:
+        sink.write(rejected)
+    err_key = sink.close()
+    if job:
+        err_key = ",".join(cp.get("errors_s3", []) + ([err_key] if err_key else []))
+    inserted = ckpt.inserted if ckpt else s_write.out
+
+    wall = time.time() - t0
+    stages = {"read": s_read.report(wall), "validate": s_val.report(wall), "write": s_write.report(wall)}
+    _audit(file, "app.employees", read, valid, invalid, err_key, bs, stages,
+           *((None, None) if catalog_misses else (etag, size)))
+
+    out = {
+        "file": key, "etag": etag, "size_bytes": size, "read": read, "valid": valid, "invalid": invalid,
+        "inserted": inserted, "skipped_existing": skipped_existing, "catalog_misses": catalog_misses, "batch_size": bs, "mode": mode,
+        "validator": validator, "writers": nw,
+        "progress_every": progress_every, "limit": limit, "errors_s3": err_key or None,
+        "elapsed_sec": round(wall, 2), "stages": stages,
+    }
+    if prefilter is not False:
+        out["prefilter"] = id_ranges.report(existing)
+    if ranges:
+        out["readers"] = readers
+        out["ranges"]  = ranges
+    return out
+
+def _loaded_etags(etags: List[str]) -> set:
+    with engine.connect() as conn:
+        return set(conn.execute(text("""
+            SELECT DISTINCT etag FROM app.ingest_audit
+            WHERE table_target = 'app.employees' AND etag = ANY(:e)
+        """), {"e": etags}).scalars())
+
+def ingest_employees_prefix(prefix: str = "",
+                            pattern: Optional[str] = None,
+                            concurrency: Optional[int] = None,
+                            force: bool = False,
+                            job=None,
+                            **params) -> Dict[str, Any]:
+    """Loads every employees shard under RAW_PREFIX/`prefix` whose name matches `pattern`
+    (default EMPLOYEES_PATTERN), up to `concurrency` files at a time. Shards whose ETag already has
+    an ingest_audit row are skipped unless `force`, so a re-run over a loaded prefix costs one
+    LIST plus one query, and re-running a failed run only loads what is missing. `params` go to
+    ingest_employees for each file (limit is not allowed: a partial load would not count as loaded)."""
+    if "limit" in params:
+        raise ValueError("limit is not supported for prefix ingests")
+    pattern = pattern or EMPLOYEES_PATTERN
+    base = f"{RAW_PREFIX.rstrip('/')}/"
+    objs = []
+    for page in s3.get_paginator("list_objects_v2").paginate(Bucket=BUCKET, Prefix=base + prefix.lstrip("/")):
+        for o in page.get("Contents", []):
+            name = o["Key"][len(base):]
+            if o["Size"] and name.lower().endswith(RAW_SUFFIXES) and fnmatch.fnmatch(name.rsplit("/", 1)[-1], pattern):
+                objs.append(o)
+    done = set() if force or not objs else _loaded_etags([o["ETag"].strip('"') for o in objs])
+    todo = [o for o in objs if o["ETag"].strip('"') not in done]
+
+    # cada archivo usa hasta `writers` cupos de escritura: no lanzar más archivos de los que entran
+    nw = max(1, min(int(params.get("writers") or INGEST_WRITERS), MAX_WRITERS))
+    conc = max(1, min(int(concurrency or INGEST_FILES_CONCURRENCY), MAX_WRITERS // nw, len(todo) or 1))
+    t0 = time.time()
+    want_prefilter = params.get("prefilter") is True
+    existing = id_ranges.load() if want_prefilter and todo else None
+    if want_prefilter:
+        params["prefilter"] = existing or False   # un solo set de ids para todos los archivos
+    results: List[Dict[str, Any]] = []
+    totals = {"read": 0, "valid": 0, "invalid": 0, "inserted": 0, "skipped_existing": 0}
+    lock = threading.Lock()
+
+    def load(o: Dict[str, Any]) -> Dict[str, Any]:
+        name = o["Key"][len(base):]
+        try:
+            r = ingest_employees(file=name, obj=o, **params)
+        except Exception as e:
+            r = {"file": o["Key"], "error": f"{type(e).__name__}: {e}"}
+        with lock:
+            results.append(r)
+            for k in totals:
+                totals[k] += r.get(k, 0)
+            if job:
+                job.progress(files=len(todo), files_done=len(results), **totals)
+        return r
+
+    with ThreadPoolExecutor(max_workers=conc, thread_name_prefix="ingest-file") as pool:
+        list(pool.map(load, todo))
+
+    failed = [r for r in results if "error" in r]
+    out = {"prefix": base + prefix.lstrip("/"), "pattern": pattern, "listed": len(objs),
+           "skipped": len(objs) - len(todo), "loaded": len(todo) - len(failed), "failed": len(failed),
+           "concurrency": conc, **totals, "elapsed_sec": round(time.time() - t0, 2),
+           "files": sorted(results, key=lambda r: r["file"])}
+    if want_prefilter and todo:
+        out["prefilter"] = id_ranges.report(existing)
+    if failed and job:
+        # el job queda failed; al retomarlo sólo se cargan los shards que faltan
+        raise RuntimeError(f"{len(failed)} of {len(todo)} files failed: " + "; ".join(f"{r['file']}: {r['error']}" for r in failed[:3]))
+    return out
@@ -0,0 +1,104 @@
+# app/instrument.py
+"""Process-wide counters and histograms for the hot paths, rendered in Prometheus text format
+by GET /metrics/prometheus. No client library: a lock and a few dicts are enough here."""
+import threading, time
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Tuple
+
+# segundos: de un round-trip local a una carga larga
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_lock = threading.Lock()
+_metrics: List["_Metric"] = []
+_gauges: List[Tuple[str, str, Callable[[], float]]] = []
+
+def _labels(labels: Dict[str, str]) -> Tuple[Tuple[str, str], ...]:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+def _fmt(labels: Tuple[Tuple[str, str], ...], le=None) -> str:
+    parts = [f'{k}="{v}"' for k, v in labels] + ([f'le="{le}"'] if le is not None else [])
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+class _Metric:
+    kind = ""
+    def __init__(self, name: str, help: str):
+        self.name, self.help = name, help
+        _metrics.append(self)
+
+class Counter(_Metric):
+    kind = "counter"
+    def __init__(self, name: str, help: str):
+        super().__init__(name, help)
+        self._values: Dict[tuple, float] = {}
+
+    def inc(self, n: float = 1, **labels):
+        key = _labels(labels)
+        with _lock:
+            self._values[key] = self._values.get(key, 0) + n
+
+    def _render(self) -> List[str]:
+        return [f"{self.name}{_fmt(k)} {v}" for k, v in self._values.items()]
+
+class Histogram(_Metric):
+    kind = "histogram"
+    def __init__(self, name: str, help: str, buckets=BUCKETS):
+        super().__init__(name, help)
+        self.buckets = tuple(buckets)
+        self._values: Dict[tuple, list] = {}   # labels -> [counts por bucket..., sum, count]
+
+    def observe(self, value: float, **labels):
+        key = _labels(labels)
+        with _lock:
+            v = self._values.get(key)
+            if v is None:
+                v = self._values[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, b in enumerate(self.buckets):
+                if value <= b:
+                    v[i] += 1
+            v[-2] += value
+            v[-1] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        t = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - t, **labels)
+
+    def _render(self) -> List[str]:
+        out = []
+        for k, v in self._values.items():
+            for b, c in zip(self.buckets, v):
+                out.append(f"{self.name}_bucket{_fmt(k, b)} {c}")
+            out += [f"{self.name}_bucket{_fmt(k, '+Inf')} {v[-1]}",
+                    f"{self.name}_sum{_fmt(k)} {v[-2]}",
+                    f"{self.name}_count{_fmt(k)} {v[-1]}"]
+        return out
+
+def gauge(name: str, help: str, fn: Callable[[], float]):
+    """Value read at scrape time (e.g. pool occupancy)."""
+    _gauges.append((name, help, fn))
+
+def render() -> str:
+    lines = []
+    with _lock:
+        for m in _metrics:
+            lines += [f"# HELP {m.name} {m.help}", f"# TYPE {m.name} {m.kind}", *m._render()]
+    for name, help, fn in _gauges:
+        try:
+            value = fn()
+        except Exception:
+            continue
+        lines += [f"# HELP {name} {help}", f"# TYPE {name} gauge", f"{name} {value}"]
+    return "\n".join(lines) + "\n"
+
+# --- métricas de la app ---
+S3_SECONDS     = Histogram("apidata_s3_request_seconds", "S3 request latency by op (range_get: full body; get_object: until headers, the body is streamed; put/upload_part: upload)")
+S3_BYTES       = Counter("apidata_s3_bytes_total", "Bytes moved to/from S3")
+STAGE_SECONDS  = Histogram("apidata_ingest_stage_seconds", "Busy time per chunk/batch of an ingest stage (read, validate, write)")
+STAGE_ROWS     = Counter("apidata_ingest_stage_rows_total", "Rows handled per ingest stage")
+DB_BATCH_SECONDS = Histogram("apidata_db_batch_seconds", "One batch written and committed, by write path")
+DB_BATCH_ROWS  = Counter("apidata_db_batch_rows_total", "Rows sent in batch writes, by write path")
+POOL_WAIT_SECONDS = Histogram("apidata_db_pool_checkout_seconds", "Wait for a pooled connection (includes opening a new one)")
+QUERY_SECONDS  = Histogram("apidata_query_seconds", "Metrics and backup/restore queries, end to end")
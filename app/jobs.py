@@ -0,0 +1,155 @@
+# app/jobs.py
+"""Background ingest jobs: the HTTP request only enqueues, a bounded thread pool does the work and
+app.ingest_jobs keeps status, live counters and the last checkpoint so a failed or interrupted
+job can be resumed where it stopped."""
+import json, os, threading, time, uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+from sqlalchemy import text
+from .db import engine
+from .ingest import ingest_departments, ingest_jobs, ingest_employees, ingest_employees_prefix
+
+JOB_WORKERS   = int(os.getenv("JOB_WORKERS", "2"))
+JOB_STALE_SEC = int(os.getenv("JOB_STALE_SEC", "300"))   # sin heartbeat por este tiempo = proceso caído
+JOB_HEARTBEAT_SEC = JOB_STALE_SEC / 3
+
+# kind -> función; las que aceptan `job` guardan checkpoints y pueden retomarse a mitad de archivo
+JOB_KINDS: Dict[str, Callable[..., Dict[str, Any]]] = {
+    "departments": lambda job, **_: ingest_departments(),
+    "jobs":        lambda job, **_: ingest_jobs(),
+    "employees":   lambda job, **params: ingest_employees(job=job, **params),
+    # sin checkpoint propio: al retomar se saltean los archivos ya auditados (ETag)
+    "employees_prefix": lambda job, **params: ingest_employees_prefix(job=job, **params),
+}
+
+# validan contra el catálogo: esperan a los jobs de departments/jobs encolados antes que ellos
+CATALOG_KINDS = ("departments", "jobs")
+NEEDS_CATALOG = ("employees", "employees_prefix")
+
+COUNTERS = ("read", "valid", "invalid", "skipped_existing", "inserted")   # los que guarda el checkpoint
+
+_pool = ThreadPoolExecutor(max_workers=JOB_WORKERS, thread_name_prefix="job")
+_live: Dict[str, "Job"] = {}   # jobs corriendo en este proceso
+_live_lock = threading.Lock()
+
+class Job:
+    """Handle passed to the ingest function: live counters plus checkpoint persistence."""
+    def __init__(self, job_id: str, checkpoint: Optional[Dict[str, Any]]):
+        self.id = job_id
+        self.checkpoint = checkpoint or {}
+        self.counters: Dict[str, Any] = {k: v for k, v in self.checkpoint.items()
+                                         if k in COUNTERS}
+
+    def progress(self, **counters):
+        self.counters = {**self.counters, **counters}
+
+    def save(self, checkpoint: Dict[str, Any]):
+        """Persists the checkpoint (and refreshes the heartbeat)."""
+        self.checkpoint = checkpoint
+        with engine.begin() as conn:
+            conn.execute(text("""UPDATE app.ingest_jobs SET checkpoint = CAST(:cp AS jsonb), updated_at = now()
+                                 WHERE id = :id"""), {"id": self.id, "cp": json.dumps(checkpoint)})
+
+def _heartbeat(job_id: str, stop: threading.Event):
+    """Keeps updated_at fresh while the job runs, checkpoints or not (catalog and prefix jobs save
+    none), so only a dead process makes a running job stale."""
+    while not stop.wait(JOB_HEARTBEAT_SEC):
+        try:
+            with engine.begin() as conn:
+                conn.execute(text("UPDATE app.ingest_jobs SET updated_at = now() WHERE id = :id AND status = 'running'"),
+                             {"id": job_id})
+        except Exception:
+            continue   # la DB puede volver antes de que el job quede stale
+
+def _wait_for_catalog(job_id: str, started):
+    """Blocks while a departments/jobs job created before `job_id` is running, or still queued since
+    before `job_id` started (in any process; stale ones don't count). Jobs queued later, e.g. a
+    resume behind this one in the pool, are not waited for, so the pool can't deadlock."""
+    while True:
+        with engine.connect() as conn:
+            busy = conn.execute(text("""
+                SELECT EXISTS (
+                    SELECT 1 FROM app.ingest_jobs c JOIN app.ingest_jobs me ON me.id = :id
+                    WHERE c.kind = ANY(:kinds) AND c.created_at < me.created_at
+                      AND (c.status = 'running' OR (c.status = 'queued' AND c.updated_at <= :started))
+                      AND c.updated_at >= now() - make_interval(secs => :stale))
+            """), {"id": job_id, "kinds": list(CATALOG_KINDS), "started": started, "stale": JOB_STALE_SEC}).scalar()
+        if not busy:
+            return
+        time.sleep(1)
+
+def _run(job_id: str):
+    with engine.begin() as conn:
+        row = conn.execute(text("""
+            UPDATE app.ingest_jobs SET status = 'running', attempts = attempts + 1, error = NULL, updated_at = now()
+            WHERE id = :id AND status = 'queued'
+            RETURNING kind, params, checkpoint, updated_at
+        """), {"id": job_id}).one_or_none()
+    if row is None:
+        return
+    job = Job(job_id, row.checkpoint)
+    with _live_lock:
+        _live[job_id] = job
+    beat = threading.Event()
+    threading.Thread(target=_heartbeat, args=(job_id, beat), name="job-heartbeat", daemon=True).start()
+    try:
+        if row.kind in NEEDS_CATALOG:
+            _wait_for_catalog(job_id, row.updated_at)
+        result = JOB_KINDS[row.kind](job, **row.params)
+    except Exception as e:
+        status, result, error = "failed", None, f"{type(e).__name__}: {e}"
+    else:
+        status, error = "succeeded", None
+    finally:
+        beat.set()
+        with _live_lock:
+            _live.pop(job_id, None)
+    with engine.begin() as conn:
+        conn.execute(text("""UPDATE app.ingest_jobs SET status = :s, result = CAST(:r AS jsonb), error = :e, updated_at = now()
+                             WHERE id = :id"""),
+                     {"id": job_id, "s": status, "r": json.dumps(result, default=str) if result else None, "e": error})
+
+def submit(kind: str, params: Dict[str, Any]) -> Dict[str, Any]:
+    """Registers a job and queues it; returns right away."""
+    if kind not in JOB_KINDS:
+        raise ValueError(f"kind must be one of {tuple(JOB_KINDS)}")
+    job_id = str(uuid.uuid4())
+    with engine.begin() as conn:
+        conn.execute(text("""INSERT INTO app.ingest_jobs (id, kind, params, status)
+                             VALUES (:id, :k, CAST(:p AS jsonb), 'queued')"""),
+                     {"id": job_id, "k": kind, "p": json.dumps(params)})
+    _pool.submit(_run, job_id)
+    return {"job_id": job_id, "kind": kind, "status": "queued"}
+
+def resume(job_id: str) -> Dict[str, Any]:
+    """Re-queues a failed job, or a running one whose heartbeat is older than JOB_STALE_SEC
+    (its process died); it restarts from the saved checkpoint."""
+    with engine.begin() as conn:
+        row = conn.execute(text("""
+            UPDATE app.ingest_jobs SET status = 'queued', updated_at = now()
+            WHERE id = :id AND (status = 'failed'
+                                OR (status IN ('queued', 'running') AND updated_at < now() - make_interval(secs => :stale)))
+            RETURNING kind
+        """), {"id": job_id, "stale": JOB_STALE_SEC}).one_or_none()
+    if row is None:
+        raise ValueError("job not found, already finished or still alive")
+    _pool.submit(_run, job_id)
+    return {"job_id": job_id, "kind": row.kind, "status": "queued"}
+
+def get(job_id: str) -> Optional[Dict[str, Any]]:
+    """Job row; counters are live while the job runs in this process, else from the checkpoint."""
+    with engine.connect() as conn:
+        row = conn.execute(text("""
+            SELECT id, kind, params, status, attempts, checkpoint, result, error, created_at, updated_at,
+                   status IN ('queued', 'running') AND updated_at < now() - make_interval(secs => :stale) AS stale
+            FROM app.ingest_jobs WHERE id = :id
+        """), {"id": job_id, "stale": JOB_STALE_SEC}).mappings().one_or_none()
+    if row is None:
+        return None
+    out = dict(row)
+    out["id"] = str(out["id"])
+    with _live_lock:
+        job = _live.get(out["id"])
+    cp = out["checkpoint"] or {}
+    out["counters"] = dict(job.counters) if job else {k: cp[k] for k in COUNTERS if k in cp}
+    return out
@@ -1,42 +1,61 @@
-from .db import ping_db
-from .s3 import ping_s3
-from fastapi import FastAPI, Query, Body, HTTPException
+from contextlib import asynccontextmanager
+from .db import ping_db_async, async_engine
+from .s3 import ping_s3_async
+from fastapi import FastAPI, Query, Body, HTTPException, Request
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from pydantic import BaseModel, Field
 from typing import Any, Dict, List, Literal
+from uuid import UUID
+from datetime import datetime
 
-from .ingest import ingest_departments, ingest_jobs, ingest_employees
-from .online import online_ingest
+from .ingest import ingest_departments, ingest_jobs, ingest_employees, ingest_employees_prefix
+from .online import online_ingest_async, coalescer
 from .metrics import hires_by_quarter, departments_above_avg
 from .backup import backup_table_parquet, restore_table_parquet
+from .export import stream_employees, EXPORT_FORMATS
+from . import metrics_cache, jobs, instrument
 
-app = FastAPI(title="Mi API REST")
+@asynccontextmanager
+async def _lifespan(app: FastAPI):
+    yield
+    await async_engine.dispose()
+
+app = FastAPI(title="Mi API REST", lifespan=_lifespan)
+
+# rutas async (engine async / S3 fuera del loop): no ocupan el threadpool de Starlette, que queda para las
+# rutas sync (ingestas batch, backup/restore, jobs)
 
 @app.get("/health")
-def health():
+async def health():
     return {"status": "ok"}
 
 @app.get("/db/ping")
-def db_ping():
+async def db_ping():
     try:
-        val = ping_db()
+        val = await ping_db_async()
         return {"db": "ok", "select_1": int(val)}
     except Exception as e:
         return {"db": "error", "detail": str(e)}
 
 @app.get("/s3/ping")
-def s3_ping():
-    return ping_s3()
+async def s3_ping():
+    return await ping_s3_async()
 
 # --- Ingesta ---
+# por defecto encolan un job (GET /jobs/{id}); wait=true corre la carga dentro del request como antes
 @app.post("/ingest/departments")
-def api_ingest_departments():
+def api_ingest_departments(wait: bool = Query(False)):
+    if not wait:
+        return jobs.submit("departments", {})
     try:
         return ingest_departments()
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/ingest/jobs")
-def api_ingest_jobs():
+def api_ingest_jobs(wait: bool = Query(False)):
+    if not wait:
+        return jobs.submit("jobs", {})
     try:
         return ingest_jobs()
     except Exception as e:
@@ -47,8 +66,55 @@ def _ing_emp(
     limit: int | None = Query(None, ge=1),
     batch_size: int | None = Query(None, ge=1, le=50000),
     progress_every: int = Query(10000, ge=1),
+    mode: Literal["insert","copy"] = Query("insert"),
+    writers: int | None = Query(None, ge=1, le=16),
+    readers: int | None = Query(None, ge=1, le=32),
+    validator: Literal["python","arrow"] = Query("python"),
+    prefilter: bool = Query(False),
+    wait: bool = Query(False),
+):
+    params = dict(limit=limit, batch_size=batch_size, progress_every=progress_every,
+                  mode=mode, writers=writers, readers=readers, validator=validator, prefilter=prefilter)
+    try:
+        return ingest_employees(**params) if wait else jobs.submit("employees", params)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+# Todos los shards bajo raw/<prefix> que matchean pattern; los ya cargados (mismo ETag) se saltean
+@app.post("/ingest/employees/prefix")
+def _ing_emp_prefix(
+    prefix: str = Query(""),
+    pattern: str | None = Query(None),
+    concurrency: int | None = Query(None, ge=1, le=16),
+    force: bool = Query(False),
+    batch_size: int | None = Query(None, ge=1, le=50000),
+    mode: Literal["insert","copy"] = Query("insert"),
+    writers: int | None = Query(None, ge=1, le=16),
+    validator: Literal["python","arrow"] = Query("python"),
+    prefilter: bool = Query(False),
+    wait: bool = Query(False),
 ):
-    return ingest_employees(limit=limit, batch_size=batch_size, progress_every=progress_every)
+    params = dict(prefix=prefix, pattern=pattern, concurrency=concurrency, force=force,
+                  batch_size=batch_size, mode=mode, writers=writers, validator=validator, prefilter=prefilter)
+    try:
+        return ingest_employees_prefix(**params) if wait else jobs.submit("employees_prefix", params)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+# Jobs
+@app.get("/jobs/{job_id}")
+def _job(job_id: UUID):
+    job = jobs.get(str(job_id))
+    if job is None:
+        raise HTTPException(status_code=404, detail="job not found")
+    return job
+
+@app.post("/jobs/{job_id}/resume")
+def _job_resume(job_id: UUID):
+    try:
+        return jobs.resume(str(job_id))
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
 
 
 # Online ingest
@@ -57,27 +123,72 @@ class OnlinePayload(BaseModel):
     rows: List[Dict[str, Any]] = Field(min_items=1, max_items=1000)
 
 @app.post("/online/ingest")
-def _online_ingest(payload: OnlinePayload):
-    return online_ingest(payload.table, payload.rows)
+async def _online_ingest(payload: OnlinePayload):
+    return await online_ingest_async(payload.table, payload.rows)
+
+@app.get("/online/stats")
+async def _online_stats():
+    return coalescer.stats()
 
 # Mtricas
 @app.get("/metrics/hires-by-quarter")
-def _m1(year: int = Query(..., ge=1900, le=2100)):
-    return {"year": year, "rows": hires_by_quarter(year)}
+async def _m1(request: Request, year: int = Query(..., ge=1900, le=2100), source: Literal["rollup","raw"] = Query("rollup")):
+    async def compute():
+        return {"year": year, "rows": await hires_by_quarter(year, source)}
+    return await metrics_cache.serve(request, ("hires-by-quarter", year, source), compute)
 
 @app.get("/metrics/top-departments")
-def _m2(year: int = Query(..., ge=1900, le=2100)):
-    return {"year": year, "rows": departments_above_avg(year)}
+async def _m2(request: Request, year: int = Query(..., ge=1900, le=2100), source: Literal["rollup","raw"] = Query("rollup")):
+    async def compute():
+        return {"year": year, "rows": await departments_above_avg(year, source)}
+    return await metrics_cache.serve(request, ("top-departments", year, source), compute)
+
+@app.get("/metrics/cache")
+async def _metrics_cache_stats():
+    return await metrics_cache.stats()
+
+@app.get("/metrics/prometheus", response_class=PlainTextResponse)
+async def _metrics_prometheus():
+    return PlainTextResponse(instrument.render(), media_type="text/plain; version=0.0.4")
+
+# Export
+@app.get("/export/employees")
+async def _export_employees(
+    dt_from: datetime | None = Query(None),
+    dt_to: datetime | None = Query(None),
+    department_id: int | None = Query(None),
+    job_id: int | None = Query(None),
+    after_dt: datetime | None = Query(None),     # keyset: dt / id de la ltima fila de la pgina anterior
+    after_id: int | None = Query(None),
+    limit: int | None = Query(None, ge=1),
+    names: bool = Query(False),
+    format: Literal["ndjson","arrow"] = Query("ndjson"),
+):
+    try:
+        body = stream_employees(format, dt_from, dt_to, department_id, job_id, after_dt, after_id, limit, names)
+    except ValueError as e:
+        raise HTTPException(400, detail=str(e))
+    return StreamingResponse(body, media_type=EXPORT_FORMATS[format])
 
 # Backups
 @app.post("/backup/{table}")
-def _backup(table: Literal["departments","jobs","employees"]):
-    return backup_table_parquet(table)
+def _backup(table: Literal["departments","jobs","employees"], incremental: bool = Query(False)):
+    return backup_table_parquet(table, incremental=incremental)
 
 class RestorePayload(BaseModel):
-    key: str
+    key: str | None = None
+    manifest: str | None = None     # manifest de backups incrementales (en lugar de key)
+    year_from: int | None = None
+    year_to: int | None = None
     batch_size: int | None = 1000
+    mode: Literal["insert","copy"] = "insert"
+    prefetch: int | None = Field(None, ge=1, le=8)
+    prefilter: bool = False         # employees: descarta en el cliente los ids que ya existen
 
 @app.post("/restore/{table}")
 def _restore(table: Literal["departments","jobs","employees"], payload: RestorePayload = Body(...)):
-    return restore_table_parquet(table, payload.key, payload.batch_size or 1000)
\ No newline at end of file
+    try:
+        return restore_table_parquet(table, payload.key, payload.batch_size or 1000, payload.mode, payload.prefetch,
+                                     payload.manifest, payload.year_from, payload.year_to, payload.prefilter)
+    except ValueError as e:
+        raise HTTPException(400, detail=str(e))
\ No newline at end of file
@@ -1,36 +1,74 @@
 from typing import List, Dict, Any
 from sqlalchemy import text
-from .db import engine
+from .db import async_engine
+from . import instrument
 
-def hires_by_quarter(year: int) -> List[Dict[str, Any]]:
-    sql = text("""
-        WITH base AS (
-          SELECT d.name AS department, j.name AS job,
-                 EXTRACT(QUARTER FROM e.dt)::int AS qtr
-          FROM app.employees e
-          JOIN app.departments d ON d.id = e.department_id
-          JOIN app.jobs j        ON j.id = e.job_id
-          WHERE EXTRACT(YEAR FROM e.dt) = :yr
-        )
-        SELECT department, job,
-               SUM(CASE WHEN qtr=1 THEN 1 ELSE 0 END) AS q1,
-               SUM(CASE WHEN qtr=2 THEN 1 ELSE 0 END) AS q2,
-               SUM(CASE WHEN qtr=3 THEN 1 ELSE 0 END) AS q3,
-               SUM(CASE WHEN qtr=4 THEN 1 ELSE 0 END) AS q4
-        FROM base
-        GROUP BY department, job
-        ORDER BY department ASC, job ASC
-    """)
-    with engine.begin() as conn:
-        return [dict(r._mapping) for r in conn.execute(sql, {"yr": year})]
+# source="rollup" lee app.hires_rollup (mantenido por las ingestas); "raw" recorre app.employees para verificar.
+METRIC_SOURCES = ("rollup", "raw")
+
+def name_joins(alias: str) -> str:
+    """Joins adding d.name / j.name to rows of `alias` (any relation with department_id, job_id)."""
+    return f"""JOIN app.departments d ON d.id = {alias}.department_id
+            JOIN app.jobs j        ON j.id = {alias}.job_id"""
+
+async def _fetch(name: str, source: str, sql, params: Dict[str, Any]) -> List[Dict[str, Any]]:
+    with instrument.QUERY_SECONDS.time(query=name, source=source):
+        async with async_engine.connect() as conn:
+            return [dict(r._mapping) for r in await conn.execute(sql, params)]
+
+async def hires_by_quarter(year: int, source: str = "rollup") -> List[Dict[str, Any]]:
+    if source == "rollup":
+        sql = text(f"""
+            SELECT d.name AS department, j.name AS job,
+                   SUM(CASE WHEN r.quarter=1 THEN r.hires ELSE 0 END)::bigint AS q1,
+                   SUM(CASE WHEN r.quarter=2 THEN r.hires ELSE 0 END)::bigint AS q2,
+                   SUM(CASE WHEN r.quarter=3 THEN r.hires ELSE 0 END)::bigint AS q3,
+                   SUM(CASE WHEN r.quarter=4 THEN r.hires ELSE 0 END)::bigint AS q4
+            FROM app.hires_rollup r
+            {name_joins("r")}
+            WHERE r.year = :yr
+            GROUP BY d.name, j.name
+            ORDER BY department ASC, job ASC
+        """)
+    elif source == "raw":
+        sql = text(f"""
+            WITH base AS (
+              SELECT d.name AS department, j.name AS job,
+                     EXTRACT(QUARTER FROM e.dt)::int AS qtr
+              FROM app.employees e
+              {name_joins("e")}
+              WHERE e.dt >= make_date(:yr, 1, 1) AND e.dt < make_date(:yr + 1, 1, 1)
+            )
+            SELECT department, job,
+                   SUM(CASE WHEN qtr=1 THEN 1 ELSE 0 END) AS q1,
+                   SUM(CASE WHEN qtr=2 THEN 1 ELSE 0 END) AS q2,
+                   SUM(CASE WHEN qtr=3 THEN 1 ELSE 0 END) AS q3,
+                   SUM(CASE WHEN qtr=4 THEN 1 ELSE 0 END) AS q4
+            FROM base
+            GROUP BY department, job
+            ORDER BY department ASC, job ASC
+        """)
+    else:
+        raise ValueError("source must be rollup|raw")
+    return await _fetch("hires_by_quarter", source, sql, {"yr": year})
 
-def departments_above_avg(year: int) -> List[Dict[str, Any]]:
-    sql = text("""
-        WITH per_dept AS (
+async def departments_above_avg(year: int, source: str = "rollup") -> List[Dict[str, Any]]:
+    if source == "rollup":
+        per_dept = """
+          SELECT r.department_id AS id, SUM(r.hires)::bigint AS hired
+          FROM app.hires_rollup r
+          WHERE r.year = :yr
+          GROUP BY r.department_id"""
+    elif source == "raw":
+        per_dept = """
           SELECT e.department_id AS id, COUNT(*) AS hired
           FROM app.employees e
-          WHERE EXTRACT(YEAR FROM e.dt) = :yr
-          GROUP BY e.department_id
+          WHERE e.dt >= make_date(:yr, 1, 1) AND e.dt < make_date(:yr + 1, 1, 1)
+          GROUP BY e.department_id"""
+    else:
+        raise ValueError("source must be rollup|raw")
+    sql = text(f"""
+        WITH per_dept AS ({per_dept}
         ), avg_all AS (
           SELECT AVG(hired)::numeric AS avg_hired FROM per_dept
         )
@@ -41,5 +79,4 @@ def departments_above_avg(year: int) -> List[Dict[str, Any]]:
         WHERE p.hired > a.avg_hired
         ORDER BY p.hired DESC, d.name ASC
     """)
-    with engine.begin() as conn:
-        return [dict(r._mapping) for r in conn.execute(sql, {"yr": year})]
+    return await _fetch("departments_above_avg", source, sql, {"yr": year})
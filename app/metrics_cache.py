@@ -0,0 +1,59 @@
+# app/metrics_cache.py
+"""Bounded LRU of serialized metrics responses, validated against the data watermark,
+with ETag / If-None-Match so unchanged dashboards get a 304 without touching the DB."""
+import hashlib, json, os, threading
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Tuple
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+from . import watermark
+
+METRICS_CACHE_SIZE = int(os.getenv("METRICS_CACHE_SIZE", "256"))
+METRICS_MAX_AGE    = int(os.getenv("METRICS_MAX_AGE", "0"))   # 0: el cliente revalida siempre (304 barato)
+
+_lock  = threading.Lock()
+_cache: "OrderedDict[Tuple, Tuple[Tuple[int, int, int], bytes]]" = OrderedDict()
+_stats = {"hits": 0, "misses": 0, "not_modified": 0, "evictions": 0}
+
+def _count(name: str):
+    with _lock:
+        _stats[name] += 1
+
+def _etag(key: Tuple, wm: Tuple[int, int, int]) -> str:
+    # BOOT: tras un reinicio (o en otro worker) el contador de escrituras no identifica los datos
+    return '"' + hashlib.sha1(repr((watermark.BOOT, key, wm)).encode()).hexdigest()[:20] + '"'
+
+async def serve(request: Request, key: Tuple, compute: Callable[[], Awaitable[Any]]) -> Response:
+    wm   = await watermark.current()
+    etag = _etag(key, wm)
+    headers = {"ETag": etag,
+               "Cache-Control": f"max-age={METRICS_MAX_AGE}, must-revalidate" if METRICS_MAX_AGE else "no-cache"}
+    inm = request.headers.get("if-none-match", "")
+    if etag in (t.strip().removeprefix("W/") for t in inm.split(",")):
+        _count("not_modified")
+        return Response(status_code=304, headers=headers)
+
+    with _lock:
+        hit = _cache.get(key)
+        if hit is not None and hit[0] == wm:
+            _cache.move_to_end(key)
+            _stats["hits"] += 1
+            body = hit[1]
+        else:
+            body = None
+    if body is None:
+        _count("misses")
+        body = json.dumps(jsonable_encoder(await compute()), ensure_ascii=False).encode("utf-8")
+        with _lock:
+            _cache[key] = (wm, body)
+            _cache.move_to_end(key)
+            while len(_cache) > METRICS_CACHE_SIZE:
+                _cache.popitem(last=False); _stats["evictions"] += 1
+    return Response(content=body, media_type="application/json", headers=headers)
+
+async def stats() -> Dict[str, Any]:
+    with _lock:
+        st = dict(_stats, size=len(_cache), capacity=METRICS_CACHE_SIZE)
+    audit_id, version, writes = await watermark.current()
+    st["watermark"] = {"audit_id": audit_id, "data_version": version, "writes": writes, "boot": watermark.BOOT}
+    return st
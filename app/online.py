@@ -1,9 +1,12 @@
 # app/online.py
+import asyncio
 from typing import List, Dict, Any, Literal
 from fastapi import HTTPException
 from sqlalchemy import text
-from .db import engine
-from .ingest import _parse_dt  # ya existe
+from .db import async_engine
+from .ingest import _parse_dt, UNNEST_INSERT_SQL
+from . import catalog, watermark, instrument
+from .coalesce import Coalescer
 
 TableName = Literal["departments", "jobs", "employees"]
 
@@ -26,9 +29,7 @@ def _validate_jobs(rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
     return _validate_departments(rows)
 
 def _validate_employees(rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-    with engine.begin() as conn:
-        dept_ids = {row[0] for row in conn.execute(text("SELECT id FROM app.departments"))}
-        job_ids  = {row[0] for row in conn.execute(text("SELECT id FROM app.jobs"))}
+    cat, refreshed = catalog.get(), False
 
     good, bad = [], []
     for r in rows:
@@ -40,8 +41,10 @@ def _validate_employees(rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
             job  = int(r["job_id"])
             if not name or dt is None:
                 raise ValueError("missing/invalid name or datetime")
-            if dep not in dept_ids: raise ValueError(f"department {dep} not found")
-            if job not in job_ids:  raise ValueError(f"job {job} not found")
+            if (dep not in cat.departments or job not in cat.jobs) and not refreshed:
+                cat, refreshed = catalog.refresh_on_miss(cat), True   # un solo refresh por request
+            if dep not in cat.departments: raise ValueError(f"department {dep} not found")
+            if job not in cat.jobs:        raise ValueError(f"job {job} not found")
             good.append({"id": rid, "name": name, "dt": dt, "department_id": dep, "job_id": job})
         except Exception as e:
             r["_reason"] = str(e); bad.append(r)
@@ -49,26 +52,52 @@ def _validate_employees(rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
         raise HTTPException(400, detail={"invalid_rows": bad})
     return good
 
-def online_ingest(table: TableName, rows: List[Dict[str, Any]]) -> Dict[str, Any]:
+_VALIDATORS = {"departments": _validate_departments, "jobs": _validate_jobs, "employees": _validate_employees}
+_COLS = {
+    "departments": ("id", "name"),
+    "jobs":        ("id", "name"),
+    "employees":   ("id", "name", "dt", "department_id", "job_id"),
+}
+def _validate(table: TableName, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
     if not (1 <= len(rows) <= 1000):
         raise HTTPException(400, detail="batch size must be 1..1000")
-
-    if table == "departments":
-        data = _validate_departments(rows)
-        sql  = text("INSERT INTO app.departments(id,name) VALUES(:id,:name) ON CONFLICT(id) DO NOTHING")
-    elif table == "jobs":
-        data = _validate_jobs(rows)
-        sql  = text("INSERT INTO app.jobs(id,name) VALUES(:id,:name) ON CONFLICT(id) DO NOTHING")
-    elif table == "employees":
-        data = _validate_employees(rows)
-        sql  = text("""INSERT INTO app.employees(id,name,dt,department_id,job_id)
-                       VALUES(:id,:name,:dt,:department_id,:job_id)
-                       ON CONFLICT(id) DO NOTHING""")
-    else:
+    if table not in _VALIDATORS:
         raise HTTPException(400, detail="unknown table")
+    return _VALIDATORS[table](rows)
+
+async def _insert_groups_async(table: TableName, groups: List[List[Dict[str, Any]]]) -> List[int]:
+    """Inserts several requests' rows in one statement, and bumps app.data_version if any row was
+    new; returns the inserted count per group. A duplicated id is credited to the first group that
+    carries it, as sequential inserts would.
+    Async engine: the flush doesn't hold a worker thread while it waits on the DB."""
+    flat = [r for g in groups for r in g]
+    with instrument.DB_BATCH_SECONDS.time(path="online", table=table):
+        async with async_engine.begin() as conn:
+            res = await conn.execute(UNNEST_INSERT_SQL[table], {c: [r[c] for r in flat] for c in _COLS[table]})
+            new_ids = {row[0] for row in res}
+            if new_ids:
+                await conn.execute(watermark.BUMP_VERSION_SQL)   # invalida las caches de todos los procesos
+    return _credit(table, groups, new_ids)
+
+def _credit(table: TableName, groups: List[List[Dict[str, Any]]], new_ids: set) -> List[int]:
+    instrument.DB_BATCH_ROWS.inc(sum(map(len, groups)), path="online", table=table)
+    if table in ("departments", "jobs"):
+        catalog.invalidate()
+    watermark.bump()
+    counts = []
+    for g in groups:
+        n = 0
+        for r in g:
+            if r["id"] in new_ids:
+                new_ids.discard(r["id"]); n += 1
+        counts.append(n)
+    return counts
 
-    with engine.begin() as conn:
-        res = conn.execute(sql, data)
-        inserted = res.rowcount or 0
+coalescer = Coalescer(_insert_groups_async)
 
+async def online_ingest_async(table: TableName, rows: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Validates one request's rows and hands them to the coalescer: concurrent requests share one
+    INSERT/commit per flush."""
+    data = await asyncio.to_thread(_validate, table, rows)   # el catálogo puede ir a la DB
+    inserted = await coalescer.submit(table, data)
     return {"table": table, "received": len(rows), "inserted": inserted}
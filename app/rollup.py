@@ -0,0 +1,55 @@
+# app/rollup.py
+"""app.hires_rollup: hire counts per (year, quarter, department_id, job_id), kept up to date by
+every employee write path and read by app/metrics.py.
+
+Backfill / re-sync:  python -m app.rollup
+"""
+import json, time
+from sqlalchemy import text
+from .db import engine
+from . import watermark
+
+def with_rollup(insert_sql: str) -> str:
+    """Wraps an `INSERT INTO app.employees ... ON CONFLICT (id) DO NOTHING` (no RETURNING) so the
+    same statement adds the rows it really inserted to the rollup. Yields one row per inserted id;
+    rollup keys are upserted in key order so concurrent writers lock them in the same order."""
+    return f"""
+        WITH ins AS (
+            {insert_sql}
+            RETURNING id, dt, department_id, job_id
+        ), roll AS (
+            INSERT INTO app.hires_rollup (year, quarter, department_id, job_id, hires)
+            SELECT EXTRACT(YEAR FROM dt)::int, EXTRACT(QUARTER FROM dt)::int, department_id, job_id, COUNT(*)
+            FROM ins
+            GROUP BY 1, 2, 3, 4
+            ORDER BY 1, 2, 3, 4
+            ON CONFLICT (year, quarter, department_id, job_id)
+            DO UPDATE SET hires = app.hires_rollup.hires + EXCLUDED.hires
+        )
+        SELECT id FROM ins
+    """
+
+def rebuild_rollup() -> dict:
+    """Recomputes the rollup from app.employees. Writers block on the table lock meanwhile and
+    add their rows after the rebuild commits, so nothing is lost or counted twice. An ingest_audit
+    row goes in the same transaction: it is what advances the watermark of the API processes,
+    since this usually runs in a process of its own."""
+    t0 = time.time()
+    with engine.begin() as conn:
+        conn.execute(text("LOCK TABLE app.hires_rollup IN EXCLUSIVE MODE"))
+        conn.execute(text("DELETE FROM app.hires_rollup"))
+        res = conn.execute(text("""
+            INSERT INTO app.hires_rollup (year, quarter, department_id, job_id, hires)
+            SELECT EXTRACT(YEAR FROM dt)::int, EXTRACT(QUARTER FROM dt)::int, department_id, job_id, COUNT(*)
+            FROM app.employees
+            GROUP BY 1, 2, 3, 4
+        """))
+        keys = res.rowcount or 0
+        hires = conn.execute(text("SELECT COALESCE(SUM(hires), 0) FROM app.hires_rollup")).scalar()
+        conn.execute(text("""INSERT INTO app.ingest_audit (file_name, table_target, total_read, valid_rows, invalid_rows)
+                             VALUES ('rebuild_rollup', 'app.hires_rollup', :n, :n, 0)"""), {"n": hires})
+    watermark.bump()
+    return {"rollup_keys": keys, "hires": int(hires), "elapsed_sec": round(time.time() - t0, 2)}
+
+if __name__ == "__main__":
+    print(json.dumps(rebuild_rollup()))
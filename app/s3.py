@@ -1,19 +1,150 @@
-import os, boto3
+import asyncio, os, boto3
+from . import instrument
 
 S3_BUCKET = os.getenv("S3_BUCKET")
 S3_PREFIX = os.getenv("S3_PREFIX", "raw/")
 AWS_REGION = os.getenv("AWS_REGION", "us-east-1")
+S3_PART_BYTES = max(int(os.getenv("S3_PART_BYTES", str(16 * 1024 * 1024))), 5 * 1024 * 1024)  # mínimo S3: 5 MiB
 
 s3 = boto3.client("s3", region_name=AWS_REGION)
 
-def ping_s3(max_keys=5):
-    """Lista algunos objetos de raw/ y backup/ para verificar permisos."""
-    result = {}
-    for prefix in [os.getenv("S3_PREFIX", "raw/"), "backup/"]:
-        try:
-            resp = s3.list_objects_v2(Bucket=S3_BUCKET, Prefix=prefix, MaxKeys=max_keys)
-            items = [obj["Key"] for obj in resp.get("Contents", [])]
-            result[prefix] = items
-        except Exception as e:
-            result[prefix] = f"ERROR: {e.__class__.__name__}: {e}"
-    return result
+def _list_keys(prefix: str, max_keys: int):
+    try:
+        resp = s3.list_objects_v2(Bucket=S3_BUCKET, Prefix=prefix, MaxKeys=max_keys)
+        return [obj["Key"] for obj in resp.get("Contents", [])]
+    except Exception as e:
+        return f"ERROR: {e.__class__.__name__}: {e}"
+
+async def ping_s3_async(max_keys=5):
+    """Lista algunos objetos de raw/ y backup/ para verificar permisos. boto3 es bloqueante: cada listado
+    corre en un hilo y en paralelo, sin bloquear el event loop."""
+    prefixes = [S3_PREFIX, "backup/"]
+    found = await asyncio.gather(*(asyncio.to_thread(_list_keys, p, max_keys) for p in prefixes))
+    return dict(zip(prefixes, found))
+
+class S3RangeFile:
+    """Read-only seekable file over an S3 object: every read() is one ranged GET.
+    Lets pyarrow fetch a Parquet footer and individual row groups without downloading the file.
+    With `etag` every GET is conditional (IfMatch), so a re-upload mid-read fails instead of mixing versions."""
+    def __init__(self, bucket: str, key: str, client=None, size: int = None, etag: str = None):
+        self.client, self.bucket, self.key, self.etag = client or s3, bucket, key, etag
+        self.size = size if size is not None else self.client.head_object(Bucket=bucket, Key=key)["ContentLength"]
+        self.pos = 0
+        self.closed = False
+        self.requests = 0
+        self.bytes_read = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self.pos
+
+    def seek(self, offset: int, whence: int = 0) -> int:
+        base = {0: 0, 1: self.pos, 2: self.size}[whence]
+        self.pos = max(0, base + offset)
+        return self.pos
+
+    def read(self, n: int = -1) -> bytes:
+        if n is None or n < 0:
+            n = self.size - self.pos
+        n = min(n, self.size - self.pos)
+        if n <= 0:
+            return b""
+        with instrument.S3_SECONDS.time(op="range_get"):
+            data = self.client.get_object(Bucket=self.bucket, Key=self.key, Range=f"bytes={self.pos}-{self.pos + n - 1}",
+                                          **({"IfMatch": f'"{self.etag}"'} if self.etag else {}))["Body"].read()
+        instrument.S3_BYTES.inc(len(data), op="range_get")
+        self.pos += len(data)
+        self.requests += 1
+        self.bytes_read += len(data)
+        return data
+
+    def close(self):
+        self.closed = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+class S3MultipartWriter:
+    """Write-only file object that streams into an S3 multipart upload, `part_size` bytes per part.
+
+    Objects smaller than one part go up with a single put_object. Use it as a context manager:
+    a clean exit completes the upload, an exception aborts it so no orphan parts are billed.
+    """
+    def __init__(self, bucket: str, key: str, part_size: int = S3_PART_BYTES, client=None, **extra):
+        self.client, self.bucket, self.key = client or s3, bucket, key
+        self.part_size, self.extra = part_size, extra
+        self.bytes = 0
+        self.closed = False
+        self._buf = bytearray()
+        self._parts = []
+        self._upload_id = None
+
+    @property
+    def parts(self) -> int:
+        return len(self._parts)
+
+    def writable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self.bytes
+
+    def flush(self):
+        pass
+
+    def write(self, data) -> int:
+        self._buf += data
+        self.bytes += len(data)
+        if len(self._buf) >= self.part_size:
+            self._upload_part()
+        return len(data)
+
+    def _upload_part(self):
+        if self._upload_id is None:
+            self._upload_id = self.client.create_multipart_upload(Bucket=self.bucket, Key=self.key, **self.extra)["UploadId"]
+        n = len(self._parts) + 1
+        with instrument.S3_SECONDS.time(op="upload_part"):
+            etag = self.client.upload_part(Bucket=self.bucket, Key=self.key, UploadId=self._upload_id,
+                                           PartNumber=n, Body=bytes(self._buf))["ETag"]
+        instrument.S3_BYTES.inc(len(self._buf), op="upload_part")
+        self._parts.append({"ETag": etag, "PartNumber": n})
+        self._buf.clear()
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        if self._upload_id is None:
+            with instrument.S3_SECONDS.time(op="put"):
+                self.client.put_object(Bucket=self.bucket, Key=self.key, Body=bytes(self._buf), **self.extra)
+            instrument.S3_BYTES.inc(len(self._buf), op="put")
+            self._parts.append({"PartNumber": 1})
+        else:
+            if self._buf:
+                self._upload_part()
+            self.client.complete_multipart_upload(Bucket=self.bucket, Key=self.key, UploadId=self._upload_id,
+                                                  MultipartUpload={"Parts": self._parts})
+        self._buf = bytearray()
+
+    def abort(self):
+        self.closed = True
+        if self._upload_id is not None:
+            self.client.abort_multipart_upload(Bucket=self.bucket, Key=self.key, UploadId=self._upload_id)
+        self._buf = bytearray()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
@@ -0,0 +1,45 @@
+# app/watermark.py
+"""Data watermark for read caches: (latest app.ingest_audit id, app.data_version, in-process
+write counter), plus BOOT, a per-process nonce for anything that leaves the process (ETags).
+
+Batch loads leave an ingest_audit row and online flushes bump app.data_version in their own
+transaction, so both survive restarts and are seen by every process; they are polled at most
+every WATERMARK_POLL_SEC. bump() only makes this process's own writes visible before the next
+poll. A writer running outside the API (e.g. python -m app.rollup) must therefore leave one of
+those rows: its bump() only reaches its own process.
+"""
+import os, threading, time, uuid
+from typing import Tuple
+from sqlalchemy import text
+from .db import async_engine
+
+WATERMARK_POLL_SEC = float(os.getenv("WATERMARK_POLL_SEC", "5"))
+
+BOOT = uuid.uuid4().hex[:12]   # el contador en memoria vuelve a 0 al reiniciar: el ETag no debe repetirse
+
+# en la misma transacción que la escritura: los otros procesos lo ven recién cuando la escritura es visible
+BUMP_VERSION_SQL = text("UPDATE app.data_version SET version = version + 1")
+
+_lock      = threading.Lock()
+_writes    = 0
+_audit_id  = 0
+_version   = 0
+_polled_at = float("-inf")
+
+def bump() -> None:
+    """Call after committing any write to employees/departments/jobs."""
+    global _writes
+    with _lock:
+        _writes += 1
+
+async def current() -> Tuple[int, int, int]:
+    global _audit_id, _version, _polled_at
+    if time.monotonic() - _polled_at >= WATERMARK_POLL_SEC:
+        async with async_engine.connect() as conn:
+            audit_id, version = (await conn.execute(text("""
+                SELECT (SELECT COALESCE(MAX(id), 0) FROM app.ingest_audit),
+                       (SELECT COALESCE(MAX(version), 0) FROM app.data_version)
+            """))).one()
+        with _lock:
+            _audit_id, _version, _polled_at = int(audit_id), int(version), time.monotonic()
+    return _audit_id, _version, _writes
@@ -0,0 +1,37 @@
+# bench/compare.py
+"""Side-by-side of two bench/run.py result files, matched by scenario + params.
+
+    python -m bench.compare bench/results/<old>.json bench/results/<new>.json
+"""
+import json, sys
+
+FIELDS = (("rows_per_sec", "rows/s"), ("p50", "p50 ms"), ("p99", "p99 ms"),
+          ("peak_rss_mb", "rss MB"), ("db_round_trips", "round trips"))
+
+def _key(r: dict) -> str:
+    return f"{r['scenario']} {json.dumps({k: v for k, v in r['params'].items() if k != 's3_key'}, sort_keys=True)}"
+
+def _val(r: dict, field: str):
+    return r["latency_ms"][field] if field in ("p50", "p99") else r.get(field)
+
+def _delta(old, new) -> str:
+    if old in (None, 0) or new is None:
+        return ""
+    return f"{(new - old) / old * 100:+.1f}%"
+
+def main(old_path: str, new_path: str):
+    old, new = (json.load(open(p, encoding="utf-8")) for p in (old_path, new_path))
+    print(f"old: {old['meta']['commit']}{' (dirty)' if old['meta']['dirty'] else ''}  "
+          f"new: {new['meta']['commit']}{' (dirty)' if new['meta']['dirty'] else ''}")
+    before = {_key(r): r for r in old["results"]}
+    for r in new["results"]:
+        o = before.get(_key(r))
+        print(f"\n{_key(r)}")
+        for field, label in FIELDS:
+            a, b = (_val(o, field) if o else None), _val(r, field)
+            print(f"  {label:<12} {str(a):>14} -> {str(b):>14} {_delta(a, b):>9}")
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        sys.exit(__doc__)
+    main(*sys.argv[1:])
@@ -0,0 +1,68 @@
+# bench/datagen.py
+"""Synthetic departments/jobs/hired_employees CSVs with a controlled share of invalid rows.
+
+    python -m bench.datagen --employees 1000000 --error-rate 0.01
+
+Same seed, same files. They go to S3_PREFIX (bench/raw/ by default) under DEPARTMENTS_FILE,
+JOBS_FILE and EMPLOYEES_FILE, streamed through a multipart upload so size is not bounded by RAM.
+"""
+import argparse, csv, datetime, io, json, os, random
+
+os.environ.setdefault("S3_PREFIX", "bench/raw/")
+os.environ.setdefault("BACKUP_PREFIX", "bench/backup/")
+
+from app.s3 import S3MultipartWriter
+from app.ingest import BUCKET, RAW_PREFIX, DEPARTMENTS_FILE, JOBS_FILE, EMPLOYEES_FILE, s3
+
+# tipos de fila inválida, repartidos en partes iguales dentro de error_rate
+ERROR_KINDS = ("missing_name", "bad_datetime", "unknown_department", "unknown_job", "id_not_integer")
+EPOCH = datetime.datetime(2020, 1, 1)
+SPAN  = 3 * 365 * 24 * 3600   # 2020..2022
+
+def _employee(i: int, rnd: random.Random, departments: int, jobs: int, error_rate: float) -> list:
+    row = [str(i), f"Employee {i}", (EPOCH + datetime.timedelta(seconds=rnd.randrange(SPAN))).strftime("%Y-%m-%dT%H:%M:%SZ"),
+           str(rnd.randint(1, departments)), str(rnd.randint(1, jobs))]
+    if rnd.random() < error_rate:
+        kind = rnd.choice(ERROR_KINDS)
+        if kind == "missing_name":         row[1] = ""
+        elif kind == "bad_datetime":       row[2] = "2021-13-45 99:00"
+        elif kind == "unknown_department": row[3] = str(departments + 1000)
+        elif kind == "unknown_job":        row[4] = str(jobs + 1000)
+        else:                              row[0] = f"x{i}"
+    return row
+
+def _upload_csv(key: str, header: list, rows) -> int:
+    n = 0
+    with S3MultipartWriter(BUCKET, key, client=s3) as out:
+        buf = io.StringIO()
+        w = csv.writer(buf, lineterminator="\n")
+        w.writerow(header)
+        for r in rows:
+            w.writerow(r); n += 1
+            if buf.tell() >= 1 << 20:
+                out.write(buf.getvalue().encode("utf-8")); buf.seek(0); buf.truncate()
+        out.write(buf.getvalue().encode("utf-8"))
+    return n
+
+def generate(employees: int = 100000, departments: int = 50, jobs: int = 200,
+             error_rate: float = 0.01, seed: int = 42) -> dict:
+    """Uploads the three files; employee ids are 1..employees (online benches use ids above)."""
+    rnd = random.Random(seed)
+    raw = RAW_PREFIX.rstrip("/")
+    _upload_csv(f"{raw}/{DEPARTMENTS_FILE}", ["id", "name"], ([str(i), f"Department {i}"] for i in range(1, departments + 1)))
+    _upload_csv(f"{raw}/{JOBS_FILE}", ["id", "name"], ([str(i), f"Job {i}"] for i in range(1, jobs + 1)))
+    _upload_csv(f"{raw}/{EMPLOYEES_FILE}", ["id", "name", "datetime", "department_id", "job_id"],
+                (_employee(i, rnd, departments, jobs, error_rate) for i in range(1, employees + 1)))
+    size = s3.head_object(Bucket=BUCKET, Key=f"{raw}/{EMPLOYEES_FILE}")["ContentLength"]
+    return {"employees": employees, "departments": departments, "jobs": jobs, "error_rate": error_rate,
+            "seed": seed, "employees_bytes": size, "prefix": RAW_PREFIX}
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--employees", type=int, default=100000)
+    ap.add_argument("--departments", type=int, default=50)
+    ap.add_argument("--jobs", type=int, default=200)
+    ap.add_argument("--error-rate", type=float, default=0.01)
+    ap.add_argument("--seed", type=int, default=42)
+    a = ap.parse_args()
+    print(json.dumps(generate(a.employees, a.departments, a.jobs, a.error_rate, a.seed)))
@@ -0,0 +1,261 @@
+# bench/run.py
+"""Ingest / online / metrics / backup benchmark against a local Postgres and a local S3 stand-in.
+
+    docker compose -f bench/docker-compose.yml up -d
+    python -m bench.run --employees 200000 --batch-sizes 1000,5000 --modes insert,copy
+
+Goes through the same functions the API calls (app.ingest, app.online, app.metrics, app.backup).
+Each scenario runs in its own child process so peak RSS is per scenario. Results (rows/sec,
+p50/p99 latency, peak RSS, DB round-trips) are written to bench/results/<timestamp>-<commit>.json;
+compare two runs with `python -m bench.compare old.json new.json`.
+
+The bench TRUNCATEs app.* between scenarios: it refuses to run unless DB_HOST is local
+(localhost, 127.0.0.1, a unix socket or the compose service name) or --force is given.
+"""
+import argparse, datetime, json, os, platform, resource, subprocess, sys, time
+
+os.environ.setdefault("S3_PREFIX", "bench/raw/")
+os.environ.setdefault("BACKUP_PREFIX", "bench/backup/")
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LOCAL_HOSTS = ("localhost", "127.0.0.1", "::1", "postgres")
+
+# ---------- medición (proceso hijo) ----------
+class _Probe:
+    """DB statements/commits on both app.db engines (sync and async), per-call latencies and wall
+    time of one scenario."""
+    def __init__(self):
+        self.statements = self.commits = 0
+        self.latencies = []
+
+    def __enter__(self):
+        from sqlalchemy import event
+        from app.db import engine, async_engine
+        def on_exec(*_): self.statements += 1
+        def on_commit(*_): self.commits += 1
+        engines = (engine, async_engine.sync_engine)   # los eventos del engine async van por su sync_engine
+        for e in engines:
+            event.listen(e, "before_cursor_execute", on_exec)
+            event.listen(e, "commit", on_commit)
+        self._off = lambda: [(event.remove(e, "before_cursor_execute", on_exec), event.remove(e, "commit", on_commit))
+                             for e in engines]
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.wall = time.perf_counter() - self.t0
+        self._off()
+
+    def timed(self, module, attr: str):
+        """Wraps module.attr so every call's duration lands in self.latencies."""
+        fn = getattr(module, attr)
+        def wrapper(*a, **kw):
+            t = time.perf_counter()
+            try:
+                return fn(*a, **kw)
+            finally:
+                self.latencies.append(time.perf_counter() - t)
+        setattr(module, attr, wrapper)
+
+    def report(self, rows: int, **extra) -> dict:
+        lat = sorted(self.latencies)
+        pct = lambda p: round(lat[min(len(lat) - 1, int(p * len(lat)))] * 1000, 3) if lat else None
+        return {"rows": rows, "wall_sec": round(self.wall, 3),
+                "rows_per_sec": round(rows / self.wall, 1) if rows and self.wall else None,
+                "latency_ms": {"n": len(lat), "p50": pct(0.50), "p99": pct(0.99)},
+                "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+                "db_statements": self.statements, "db_commits": self.commits,
+                "db_round_trips": self.statements + self.commits,   # los COPY de copy_merge no se cuentan aparte
+                **extra}
+
+def _truncate(*tables: str):
+    from sqlalchemy import text
+    from app.db import engine
+    from app import catalog
+    with engine.begin() as conn:
+        conn.execute(text(f"TRUNCATE {', '.join('app.' + t for t in tables)}"))
+    catalog.invalidate()
+
+def _sc_catalog(p: dict) -> dict:
+    from app import ingest
+    _truncate("employees", "hires_rollup", "departments", "jobs")
+    with _Probe() as pr:
+        pr.timed(ingest, "_ingest_catalog")
+        d, j = ingest.ingest_departments(), ingest.ingest_jobs()
+    return pr.report(d["read"] + j["read"], invalid=d["invalid"] + j["invalid"])
+
+def _sc_ingest_employees(p: dict) -> dict:
+    from app import ingest
+    _truncate("employees", "hires_rollup")
+    with _Probe() as pr:
+        pr.timed(ingest, "_write_employees")   # latencia = un lote escrito y confirmado
+        r = ingest.ingest_employees(batch_size=p["batch_size"], mode=p["mode"], validator=p["validator"],
+                                    writers=p["writers"], readers=p["readers"], progress_every=10 ** 9)
+    return pr.report(r["read"], valid=r["valid"], invalid=r["invalid"], inserted=r["inserted"], stages=r["stages"])
+
+def _sc_online(p: dict) -> dict:
+    import asyncio, random
+    from app import online
+    rnd = random.Random(p["seed"])
+    first = p["employees"] + 1
+
+    def rows(i: int):
+        base = first + i * p["rows_per_request"]
+        return [{"id": base + k, "name": f"Online {base + k}", "datetime": "2022-06-01 12:00:00",
+                 "department_id": rnd.randint(1, p["departments"]), "job_id": rnd.randint(1, p["jobs"])}
+                for k in range(p["rows_per_request"])]
+
+    async def main(pr: _Probe):
+        sem = asyncio.Semaphore(p["concurrency"])
+        async def one(i: int):
+            async with sem:
+                t = time.perf_counter()
+                await online.online_ingest_async("employees", rows(i))
+                pr.latencies.append(time.perf_counter() - t)   # latencia = un request
+        await asyncio.gather(*(one(i) for i in range(p["requests"])))
+
+    with _Probe() as pr:
+        asyncio.run(main(pr))
+    return pr.report(p["requests"] * p["rows_per_request"], coalescer=online.coalescer.stats())
+
+def _sc_metrics(p: dict) -> dict:
+    import asyncio
+    from app import metrics
+    fn = getattr(metrics, p["metric"])
+
+    async def main(pr: _Probe):   # un solo event loop: el pool del engine async se reutiliza entre consultas
+        for _ in range(p["repeat"]):
+            for year in (2020, 2021, 2022):
+                t = time.perf_counter()
+                await fn(year, p["source"])
+                pr.latencies.append(time.perf_counter() - t)   # latencia = una consulta
+
+    with _Probe() as pr:
+        asyncio.run(main(pr))
+    return pr.report(0, calls=len(pr.latencies), calls_per_sec=round(len(pr.latencies) / pr.wall, 1))
+
+def _sc_backup(p: dict) -> dict:
+    from app import backup
+    with _Probe() as pr:
+        r = backup.backup_table_parquet("employees")
+    return pr.report(r["rows"], bytes=r["bytes"], parts=r["parts"], s3_key=r["s3_key"])
+
+def _sc_restore(p: dict) -> dict:
+    from app import backup
+    _truncate("employees", "hires_rollup")
+    with _Probe() as pr:
+        pr.timed(backup, "_restore_chunk")   # latencia = un chunk escrito y confirmado
+        r = backup.restore_table_parquet("employees", p["s3_key"], p["batch_size"], p["mode"])
+    return pr.report(r["rows"], restored=r["restored"], bytes_fetched=r["bytes_fetched"])
+
+SCENARIOS = {
+    "catalog": _sc_catalog, "ingest_employees": _sc_ingest_employees, "online": _sc_online,
+    "metrics": _sc_metrics, "backup": _sc_backup, "restore": _sc_restore,
+}
+
+# ---------- orquestación (proceso padre) ----------
+def _child(scenario: str, params: dict) -> dict:
+    out = subprocess.run([sys.executable, "-m", "bench.run", "--child", json.dumps({"scenario": scenario, "params": params})],
+                         cwd=ROOT, capture_output=True, text=True)
+    if out.returncode != 0:
+        raise RuntimeError(f"{scenario} {params} failed:\n{out.stderr[-4000:]}")
+    res = {"scenario": scenario, "params": params, **json.loads(out.stdout.strip().splitlines()[-1])}
+    print(f"{scenario:<17} {json.dumps(params, sort_keys=True):<90} rows/s={res['rows_per_sec']} "
+          f"p50={res['latency_ms']['p50']}ms p99={res['latency_ms']['p99']}ms rss={res['peak_rss_mb']}MB "
+          f"rt={res['db_round_trips']}", file=sys.stderr)
+    return res
+
+def _init_schema():
+    """Runs sql/schema.sql (idempotent: CREATE ... IF NOT EXISTS plus the ALTER/DROP migrations)."""
+    from app.db import engine
+    ddl = open(os.path.join(ROOT, "sql", "schema.sql"), encoding="utf-8").read()
+    with engine.begin() as conn:
+        conn.connection.dbapi_connection.execute(ddl)   # sin parámetros: psycopg acepta varias sentencias
+
+def _git(*args: str) -> str:
+    try:
+        return subprocess.run(["git", *args], cwd=ROOT, capture_output=True, text=True).stdout.strip()
+    except OSError:
+        return ""
+
+def _csv(s: str, cast=str) -> list:
+    return [cast(x) for x in s.split(",") if x]
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--employees", type=int, default=100000)
+    ap.add_argument("--departments", type=int, default=50)
+    ap.add_argument("--jobs", type=int, default=200)
+    ap.add_argument("--error-rate", type=float, default=0.01)
+    ap.add_argument("--seed", type=int, default=42)
+    ap.add_argument("--skip-gen", action="store_true", help="reuse the files already under S3_PREFIX")
+    ap.add_argument("--batch-sizes", default="1000,5000")
+    ap.add_argument("--modes", default="insert,copy")
+    ap.add_argument("--validators", default="python")
+    ap.add_argument("--writers", default="1")
+    ap.add_argument("--readers", default="1")
+    ap.add_argument("--online-requests", type=int, default=2000)
+    ap.add_argument("--online-rows", type=int, default=10, help="rows per online request")
+    ap.add_argument("--online-concurrency", type=int, default=50)
+    ap.add_argument("--metrics-repeat", type=int, default=20)
+    ap.add_argument("--only", default="", help="comma list of scenarios to run (default: all)")
+    ap.add_argument("--out", default=os.path.join(ROOT, "bench", "results"))
+    ap.add_argument("--force", action="store_true", help="allow a non-local DB_HOST")
+    ap.add_argument("--child", help=argparse.SUPPRESS)
+    a = ap.parse_args(argv)
+
+    if a.child:
+        spec = json.loads(a.child)
+        print(json.dumps(SCENARIOS[spec["scenario"]](spec["params"]), default=str))
+        return
+
+    host = os.getenv("DB_HOST", "")
+    if not (a.force or host in LOCAL_HOSTS or host.startswith("/")):
+        sys.exit(f"DB_HOST={host!r} does not look local; the bench truncates app.* (use --force)")
+    only = set(_csv(a.only)) or set(SCENARIOS)
+
+    _init_schema()
+    if a.skip_gen:
+        data = {"skipped": True, "prefix": os.environ["S3_PREFIX"]}
+    else:
+        from bench.datagen import generate
+        data = generate(a.employees, a.departments, a.jobs, a.error_rate, a.seed)
+
+    results = []
+    run = lambda sc, params: results.append(_child(sc, params)) if sc in only else None
+    cat = _child("catalog", {})   # el catálogo siempre se carga: lo necesitan employees y online
+    if "catalog" in only:
+        results.append(cat)
+    for bs in _csv(a.batch_sizes, int):
+        for mode in _csv(a.modes):
+            for validator in _csv(a.validators):
+                for nw in _csv(a.writers, int):
+                    for nr in _csv(a.readers, int):
+                        run("ingest_employees", {"batch_size": bs, "mode": mode, "validator": validator,
+                                                 "writers": nw, "readers": nr})
+    run("online", {"requests": a.online_requests, "rows_per_request": a.online_rows,
+                   "concurrency": a.online_concurrency, "employees": a.employees,
+                   "departments": a.departments, "jobs": a.jobs, "seed": a.seed})
+    for metric in ("hires_by_quarter", "departments_above_avg"):
+        for source in ("rollup", "raw"):
+            run("metrics", {"metric": metric, "source": source, "repeat": a.metrics_repeat})
+    if only & {"backup", "restore"}:
+        bk = _child("backup", {})
+        if "backup" in only:
+            results.append(bk)
+        for mode in _csv(a.modes):
+            run("restore", {"s3_key": bk["s3_key"], "batch_size": max(_csv(a.batch_sizes, int)), "mode": mode})
+
+    commit = _git("rev-parse", "--short", "HEAD") or "nogit"
+    ts = datetime.datetime.utcnow().strftime("%Y%m%dT%H%M%S")
+    os.makedirs(a.out, exist_ok=True)
+    path = os.path.join(a.out, f"{ts}-{commit}.json")
+    meta = {"commit": commit, "dirty": bool(_git("status", "--porcelain", "--untracked-files=no")),
+            "started_utc": ts, "python": platform.python_version(), "platform": platform.platform(),
+            "cpus": os.cpu_count(), "args": {k: v for k, v in vars(a).items() if k != "child"}, "data": data}
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"meta": meta, "results": results}, f, indent=2, default=str)
+    print(path)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+-- Esquema app: idempotente (CREATE ... IF NOT EXISTS; los ALTER/DROP migran bases creadas antes).
+-- psql "host=$DB_HOST dbname=$DB_NAME user=$DB_USER" -f sql/schema.sql   (bench/run.py lo corre al arrancar)
+
+CREATE SCHEMA IF NOT EXISTS app;
+
+CREATE TABLE IF NOT EXISTS app.departments(
+  id         INT PRIMARY KEY,
+  name       TEXT NOT NULL,
+  ingest_xid XID8 NOT NULL DEFAULT pg_current_xact_id()
+);
+
+CREATE TABLE IF NOT EXISTS app.jobs(
+  id         INT PRIMARY KEY,
+  name       TEXT NOT NULL,
+  ingest_xid XID8 NOT NULL DEFAULT pg_current_xact_id()
+);
+
+CREATE TABLE IF NOT EXISTS app.employees(
+  id            INT PRIMARY KEY,
+  name          TEXT NOT NULL,
+  dt            TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+  department_id INT NOT NULL REFERENCES app.departments(id),
+  job_id        INT NOT NULL REFERENCES app.jobs(id),
+  ingest_xid    XID8 NOT NULL DEFAULT pg_current_xact_id()   -- transacción que insertó la fila (backup incremental)
+);
+-- bases creadas antes de ingest_xid (reescribe la tabla: las filas existentes quedan con el xid del ALTER)
+ALTER TABLE app.departments ADD COLUMN IF NOT EXISTS ingest_xid XID8 NOT NULL DEFAULT pg_current_xact_id();
+ALTER TABLE app.jobs ADD COLUMN IF NOT EXISTS ingest_xid XID8 NOT NULL DEFAULT pg_current_xact_id();
+ALTER TABLE app.employees ADD COLUMN IF NOT EXISTS ingest_xid XID8 NOT NULL DEFAULT pg_current_xact_id();
+CREATE INDEX IF NOT EXISTS employees_ingest_xid_idx ON app.employees(ingest_xid);
+
+CREATE TABLE IF NOT EXISTS app.ingest_audit(
+  id           BIGSERIAL PRIMARY KEY,
+  file_name    TEXT,
+  table_target TEXT,
+  total_read   INT,
+  valid_rows   INT,
+  invalid_rows INT,
+  batch_size   INT,
+  error_s3_key TEXT,
+  stages       JSONB,          -- read/validate/write: filas, busy_sec, rows_per_sec, pool_wait_sec
+  etag         TEXT,           -- ETag/tamaño del objeto S3; sólo en cargas completas (sin limit)
+  size_bytes   BIGINT,
+  created_at   TIMESTAMP DEFAULT NOW()
+);
+-- bases creadas antes de las columnas stages / etag / size_bytes
+ALTER TABLE app.ingest_audit ADD COLUMN IF NOT EXISTS stages JSONB;
+ALTER TABLE app.ingest_audit ADD COLUMN IF NOT EXISTS etag TEXT;
+ALTER TABLE app.ingest_audit ADD COLUMN IF NOT EXISTS size_bytes BIGINT;
+CREATE INDEX IF NOT EXISTS ingest_audit_etag_idx ON app.ingest_audit(etag);
+
+-- jobs de ingesta en segundo plano (app/jobs.py): estado, checkpoint y resultado
+CREATE TABLE IF NOT EXISTS app.ingest_jobs(
+  id           UUID PRIMARY KEY,
+  kind         TEXT        NOT NULL,
+  params       JSONB       NOT NULL,
+  status       TEXT        NOT NULL,   -- queued | running | succeeded | failed
+  attempts     INT         NOT NULL DEFAULT 0,
+  checkpoint   JSONB,                  -- offset en bytes + ETag + contadores del último lote confirmado
+  result       JSONB,
+  error        TEXT,
+  created_at   TIMESTAMP   NOT NULL DEFAULT NOW(),
+  updated_at   TIMESTAMP   NOT NULL DEFAULT NOW()
+);
+
+-- rollup de contrataciones (lo mantienen las ingestas; backfill: python -m app.rollup)
+CREATE TABLE IF NOT EXISTS app.hires_rollup(
+  year          INT      NOT NULL,
+  quarter       SMALLINT NOT NULL,
+  department_id INT      NOT NULL,
+  job_id        INT      NOT NULL,
+  hires         BIGINT   NOT NULL,
+  PRIMARY KEY (year, quarter, department_id, job_id)
+);
+
+-- versión de los datos para el watermark de las caches: la sube cada flush de la ingesta online en su transacción
+CREATE TABLE IF NOT EXISTS app.data_version(
+  id      BOOLEAN PRIMARY KEY DEFAULT true CHECK (id),   -- una sola fila
+  version BIGINT  NOT NULL DEFAULT 0
+);
+INSERT INTO app.data_version DEFAULT VALUES ON CONFLICT DO NOTHING;
+
+-- (dt, id): rangos de fecha de las métricas y paginación keyset de /export/employees
+CREATE INDEX IF NOT EXISTS employees_dt_id_idx ON app.employees(dt, id);
+DROP INDEX IF EXISTS app.employees_dt_idx;   -- lo cubre employees_dt_id_idx
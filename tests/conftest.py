@@ -0,0 +1,44 @@
+import io, os, sys
+import pytest
+from botocore.exceptions import ClientError
+
+# app.* lee el entorno al importarse; estos tests no tocan Postgres ni S3 reales
+os.environ.setdefault("AWS_REGION", "us-east-1")
+os.environ.setdefault("S3_BUCKET", "test-bucket")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import catalog, ingest
+
+class FakeS3:
+    """In-memory stand-in for the S3 calls the raw readers make: head_object and get_object,
+    whole or with a Range header, optionally conditional on IfMatch (every object's ETag is "test")."""
+    def __init__(self):
+        self.objects = {}
+
+    def _check(self, op, IfMatch):
+        if IfMatch not in (None, '"test"'):
+            raise ClientError({"Error": {"Code": "PreconditionFailed"}}, op)
+
+    def head_object(self, Bucket, Key, IfMatch=None):
+        self._check("HeadObject", IfMatch)
+        return {"ContentLength": len(self.objects[Key]), "ETag": '"test"'}
+
+    def get_object(self, Bucket, Key, Range=None, IfMatch=None):
+        self._check("GetObject", IfMatch)
+        data = self.objects[Key]
+        if Range:
+            a, b = Range.removeprefix("bytes=").split("-")
+            data = data[int(a):int(b) + 1]
+        return {"Body": io.BytesIO(data)}
+
+@pytest.fixture
+def s3(monkeypatch):
+    fake = FakeS3()
+    monkeypatch.setattr(ingest, "s3", fake)
+    return fake
+
+@pytest.fixture
+def cat(monkeypatch):
+    """Departments {1, 2}, jobs {10, 11}; a miss never reloads from the DB."""
+    monkeypatch.setattr(catalog, "refresh_on_miss", lambda seen: seen)
+    return catalog.CatalogSnapshot(1, frozenset({1, 2}), frozenset({10, 11}), 0.0)
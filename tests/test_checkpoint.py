@@ -0,0 +1,60 @@
+from app import ingest
+
+class _Job:
+    def __init__(self):
+        self.saves = []
+
+    def save(self, checkpoint):
+        self.saves.append(dict(checkpoint))
+
+def test_offset_waits_for_earlier_batches():
+    job = _Job()
+    ck = ingest._Checkpointer(job, {})
+    s0, s1 = ck.issue(), ck.issue()
+    ck.mark(100, {"read": 10}, buffered=False)
+    s2 = ck.issue()
+    ck.mark(200, {"read": 20}, buffered=False)
+
+    ck.commit(s2, 3)
+    ck.commit(s1, 5)
+    assert job.saves == []          # el lote 0 sigue en vuelo
+    ck.commit(s0, 4)
+    assert job.saves == [{"read": 20, "offset": 200, "inserted": 12}]
+
+def test_marks_advance_one_by_one():
+    job = _Job()
+    ck = ingest._Checkpointer(job, {})
+    s0 = ck.issue()
+    ck.mark(100, {"read": 10}, buffered=False)
+    s1 = ck.issue()
+    ck.mark(200, {"read": 20}, buffered=False)
+
+    ck.commit(s0, 4)
+    assert job.saves[-1] == {"read": 10, "offset": 100, "inserted": 4}
+    ck.commit(s1, 6)
+    assert job.saves[-1] == {"read": 20, "offset": 200, "inserted": 10}
+
+def test_buffered_rows_wait_for_next_batch():
+    job = _Job()
+    ck = ingest._Checkpointer(job, {})
+    s0 = ck.issue()
+    ck.mark(100, {"read": 10}, buffered=True)   # parte de las filas aún en el buffer
+    ck.commit(s0, 4)
+    assert job.saves == []
+    s1 = ck.issue()
+    ck.commit(s1, 6)
+    assert job.saves == [{"read": 10, "offset": 100, "inserted": 10}]
+
+def test_chunk_without_valid_rows_saves_at_once():
+    job = _Job()
+    ck = ingest._Checkpointer(job, {})
+    ck.mark(50, {"read": 5, "invalid": 5}, buffered=False)
+    assert job.saves == [{"read": 5, "invalid": 5, "offset": 50, "inserted": 0}]
+
+def test_resume_adds_to_base():
+    job = _Job()
+    ck = ingest._Checkpointer(job, {"offset": 100, "inserted": 7, "read": 10, "key": "k"})
+    s0 = ck.issue()
+    ck.mark(300, {"read": 30}, buffered=False)
+    ck.commit(s0, 5)
+    assert job.saves == [{"offset": 300, "inserted": 12, "read": 30, "key": "k"}]
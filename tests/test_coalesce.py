@@ -0,0 +1,82 @@
+import asyncio
+import pytest
+from app.coalesce import Coalescer
+from app import online
+
+def _run(coro):
+    return asyncio.run(coro)
+
+class _Table:
+    """flush_fn over in-memory id sets (one per table), crediting duplicates like app.online._credit."""
+    def __init__(self, fail_if=None):
+        self.tables, self.calls, self.fail_if = {}, [], fail_if
+
+    @property
+    def ids(self):
+        return self.tables.setdefault("employees", set())
+
+    async def flush(self, table, groups):
+        self.calls.append([[r["id"] for r in g] for g in groups])
+        if self.fail_if and any(self.fail_if(r) for g in groups for r in g):
+            raise ValueError("bad row")
+        ids = self.tables.setdefault(table, set())
+        new = {r["id"] for g in groups for r in g} - ids
+        ids |= new
+        counts = []
+        for g in groups:
+            counts.append(sum(1 for r in g if r["id"] in new))
+            new -= {r["id"] for r in g}
+        return counts
+
+def _rows(*ids):
+    return [{"id": i} for i in ids]
+
+def test_one_flush_per_window_with_per_caller_counts():
+    t = _Table()
+    t.ids.add(3)
+    async def main():
+        c = Coalescer(t.flush, flush_ms=20, max_rows=100)
+        return await asyncio.gather(c.submit("employees", _rows(1, 2)),
+                                    c.submit("employees", _rows(2, 3, 4)),
+                                    c.submit("employees", _rows(5))), c.stats()
+    counts, st = _run(main())
+    assert counts == [2, 1, 1]
+    assert t.calls == [[[1, 2], [2, 3, 4], [5]]]
+    assert st["flushes"] == 1 and st["requests"] == 3 and st["flush_by_timer"] == 1
+
+def test_flush_by_size():
+    t = _Table()
+    async def main():
+        c = Coalescer(t.flush, flush_ms=10_000, max_rows=3)
+        return await asyncio.gather(c.submit("jobs", _rows(1, 2)), c.submit("jobs", _rows(3))), c.stats()
+    counts, st = _run(main())
+    assert counts == [2, 1] and st["flush_by_size"] == 1
+
+def test_tables_flush_separately():
+    t = _Table()
+    async def main():
+        c = Coalescer(t.flush, flush_ms=5)
+        return await asyncio.gather(c.submit("jobs", _rows(1)), c.submit("departments", _rows(1)))
+    assert _run(main()) == [1, 1]
+    assert sorted(t.calls) == [[[1]], [[1]]]
+
+def test_failed_flush_retries_each_group_alone():
+    t = _Table(fail_if=lambda r: r["id"] < 0)
+    async def main():
+        c = Coalescer(t.flush, flush_ms=5)
+        res = await asyncio.gather(c.submit("employees", _rows(1)), c.submit("employees", _rows(-1, 2)),
+                                   c.submit("employees", _rows(3)), return_exceptions=True)
+        return res, c.stats()
+    (ok1, bad, ok2), st = _run(main())
+    assert (ok1, ok2) == (1, 1)
+    assert isinstance(bad, ValueError)
+    assert 2 not in t.ids   # la fila válida del grupo fallido no se escribe
+    assert t.calls[1:] == [[[1]], [[-1, 2]], [[3]]]
+    assert st["fallback_flushes"] == 1
+
+def test_credit_gives_a_duplicate_id_to_the_first_group():
+    groups = [_rows(1, 2), _rows(2, 3), _rows(3, 4), _rows(1)]
+    assert online._credit("employees", groups, {1, 2, 3}) == [2, 1, 0, 0]
+
+def test_credit_ignores_ids_that_already_existed():
+    assert online._credit("employees", [_rows(7, 8), _rows(9)], set()) == [0, 0]
@@ -0,0 +1,33 @@
+import numpy as np
+import pyarrow as pa
+from app.id_ranges import IdRanges
+
+def _ranges(*pairs):
+    lo, hi = zip(*pairs) if pairs else ((), ())
+    return IdRanges(np.array(lo, np.int64), np.array(hi, np.int64))
+
+def test_mask_edges():
+    r = _ranges((1, 3), (10, 12), (20, 20))
+    ids = [0, 1, 2, 3, 4, 9, 10, 12, 13, 19, 20, 21, -5]
+    assert r.mask(ids).tolist() == [i in {1, 2, 3, 10, 11, 12, 20} for i in ids]
+
+def test_drop_rows_keeps_order_and_counts():
+    r = _ranges((1, 3), (10, 12))
+    rows = [{"id": i, "name": str(i)} for i in (11, 5, 1, 4, 12, 13)]
+    kept, dropped = r.drop_rows(rows)
+    assert [x["id"] for x in kept] == [5, 4, 13]
+    assert dropped == 3
+
+def test_drop_batch_matches_drop_rows():
+    r = _ranges((1, 3), (10, 12))
+    rows = [{"id": i, "name": str(i)} for i in (11, 5, 1, 4, 12, 13)]
+    batch, dropped = r.drop_batch(pa.RecordBatch.from_pylist(rows))
+    assert batch.to_pylist() == r.drop_rows(rows)[0] and dropped == 3
+
+def test_empty_set_and_empty_input():
+    empty = _ranges()
+    rows = [{"id": 1}]
+    assert empty.drop_rows(rows) == (rows, 0)
+    assert _ranges((1, 2)).drop_rows([]) == ([], 0)
+    assert empty.mask([1, 2]).tolist() == [False, False]
+    assert empty.stats()["ranges"] == 0
@@ -0,0 +1,18 @@
+import pytest
+from app import ingest
+
+DATA = (b'id,name,datetime,department_id,job_id\r\n'
+        + b''.join(b'%d,"Row, %d",2021-01-05,1,10\r\n' % (i, i) for i in range(1, 300))
+        + b'\n300,Last,2021-01-05,2')
+
+@pytest.mark.parametrize("range_bytes", [16, 1000, 1 << 20])
+@pytest.mark.parametrize("workers", [1, 4])
+def test_ranged_matches_dictreader(s3, monkeypatch, range_bytes, workers):
+    s3.objects["emp.csv"] = DATA
+    monkeypatch.setattr(ingest, "RANGE_BYTES", range_bytes)
+    ranges = []
+    rows = list(ingest._iter_employees_ranged("emp.csv", workers, ranges))
+
+    assert rows == list(ingest._iter_employees_from_s3("emp.csv"))
+    assert sum(r["rows"] for r in ranges) == 300
+    assert [r["start"] for r in ranges[1:]] == [r["end"] for r in ranges[:-1]]